@@ -1,10 +1,38 @@
-from dash import Dash, dcc, html, Input, Output
-import plotly_express as px
+from dash import Dash, dcc, html, Input, Output, State, ClientsideFunction
+import plotly.io as pio
+import plotly.graph_objects as go
+import plotly.utils
 import pandas as pd
 import json
+import os
+import gc
+import time
+import logging
+import base64
+import numpy as np
+from flask_compress import Compress
+
+from source_code.aggregate_cube import (
+    check_cube,
+    load_cube,
+    yearly_means,
+)
+from source_code.app_cache import LRUCache
+from source_code.app_metrics import Timings
+from source_code.station_metrics import (
+    CATEGORY_COLORS,
+    STATIONS_PATH,
+    load_stations,
+    station_metrics,
+)
 
 app = Dash(__name__)
 server = app.server
+# Brotli (gzip for the older browsers) for the callback responses and the assets
+server.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+server.config["COMPRESS_BR_LEVEL"] = 4
+Compress(server)
+logger = logging.getLogger(__name__)
 
 # Step 1. Preparing the elements for the app
 # a. Getting the data:
@@ -12,21 +40,88 @@ server = app.server
 coordinates = pd.read_csv("app_data/coordinates.csv")
 coordinates.id = coordinates.id.apply(lambda x: str(x).zfill(5))
 stations_id = coordinates.id.unique()
-# b. Plotting the map for Germany:
-ge_map = px.scatter_geo(
-    lon=coordinates.lon, lat=coordinates.lat, hover_name=coordinates.id
-)
-ge_map.update_layout(
-    title="Locations in Germany<br>(click on the map)<br>",
-    title_x=0.5,
-    geo_scope="europe",
-    geo=dict(projection_scale=7, center=dict(lat=51.5, lon=10)),
-    clickmode="event+select",
-)
-ge_map.update_traces(
-    marker=dict(size=12, line=dict(width=2, color="DarkSlateGrey")),
-    selector=dict(mode="markers"),
-)
+# The hourly data aggregated by station, year and month, built offline from app_data/hourly
+# with python -m source_code.aggregate_cube: the app does not start without it or with a stale one
+check_cube(list(stations_id))
+# read into memory once: with gunicorn --preload the workers share these pages (copy-on-write)
+cube = load_cube(mmap_mode=None)
+# Caches shared by the threads of a worker: the yearly series of the stations and what is sent to the browser
+series_cache = LRUCache(max_items=1024, max_bytes=32 * 2**20)
+payload_cache = LRUCache(max_items=512, max_bytes=64 * 2**20)
+# Time spent in the callbacks: data load, aggregation and figure build (see /metrics)
+timings = Timings()
+# All the DWD hourly stations for the map (only the stations of the cube have data)
+if os.path.exists(STATIONS_PATH):
+    stations = load_stations()
+else:
+    stations = coordinates[["id", "lat", "lon"]].assign(name=coordinates.id)
+# The parameters of the dropdown: the metric of the cube, the label, the name of the line,
+# the title and the y axis of the figure
+VIEWS = {
+    "temperature": (
+        "TT_TU",
+        "temperature",
+        "average_temperature",
+        "Average temperatures in Germany",
+        "% of hours with optimal temperature for Septoria",
+    ),
+    "moisture": (
+        "RF_STD",
+        "moisture",
+        "average_humidity",
+        "Average relative humidity in Germany",
+        "relative humidity (%)",
+    ),
+    "t_risk": (
+        "t_risk",
+        "Fusarium temperature risk",
+        "temperature_risk",
+        "Fusarium risk from the temperature",
+        "average hourly risk",
+    ),
+    "rh_risk": (
+        "rh_risk",
+        "Fusarium humidity risk",
+        "humidity_risk",
+        "Fusarium risk from the relative humidity",
+        "average hourly risk",
+    ),
+    "combined_sqrt": (
+        "combined_sqrt",
+        "Fusarium combined risk (sqrt)",
+        "combined_risk",
+        "Fusarium risk, square root of the temperature x humidity risk",
+        "average hourly risk",
+    ),
+    "combined_LTRH80": (
+        "combined_LTRH80",
+        "Fusarium combined risk (RH > 80%)",
+        "combined_risk",
+        "Fusarium temperature risk in the hours with RH above 80%",
+        "average hourly risk",
+    ),
+    "combined_LTRH90": (
+        "combined_LTRH90",
+        "Fusarium combined risk (RH > 90%)",
+        "combined_risk",
+        "Fusarium temperature risk in the hours with RH above 90%",
+        "average hourly risk",
+    ),
+    "leaf_wetness": (
+        "leaf_wetness",
+        "leaf wetness (RH >= 90%)",
+        "leaf_wetness",
+        "Leaf wetness from the relative humidity (RH >= 90%)",
+        "fraction of wet hours",
+    ),
+}
+# At most that many stations are drawn together when selecting on the map
+MAX_OVERLAY = 20
+# The selection when the page opens
+DEFAULT_STATION = "01550"
+DEFAULT_YEARS = [1960, 2010]
+DEFAULT_REFERENCE = [1960, 1980]
+DEFAULT_MONTHS = [4, 8]
 month_marks = {
     1: "January",
     2: "Feb",
@@ -66,21 +161,32 @@ app.layout = html.Div(
         html.H4("Select the parameter"),
         dcc.Dropdown(
             options=[
-                {"label": "moisture", "value": "moisture"},
-                {"label": "temperature", "value": "temperature"},
+                {"label": view[1], "value": parameter}
+                for parameter, view in VIEWS.items()
             ],
             value="temperature",
             id="parameter",
         ),
         html.H4("Select the ids"),
         # dcc.Dropdown(options=df.STATIONS_ID.unique(), value="01550", id="stations_id"),
-        dcc.Graph(figure=ge_map, id="basic-interactions", clickData=None),
+        dcc.RadioItems(
+            options=[
+                {"label": "stations", "value": "stations"},
+                {"label": "trend slope", "value": "slope"},
+                {"label": "anomaly against the reference period", "value": "anomaly"},
+                {"label": "significance category", "value": "category"},
+            ],
+            value="stations",
+            id="map-color",
+            inline=True,
+        ),
+        dcc.Graph(id="basic-interactions", clickData=None),
         html.H4("Select the time range"),
         dcc.RangeSlider(
             min=1950,
             max=2020,
             step=None,
-            value=[1960, 2010],
+            value=DEFAULT_YEARS,
             id="year-slider",
             marks=year_marks,
         ),
@@ -89,7 +195,7 @@ app.layout = html.Div(
             min=1950,
             max=2020,
             step=None,
-            value=[1960, 1980],
+            value=DEFAULT_REFERENCE,
             id="reference_slider",
             marks=year_marks,
         ),
@@ -99,84 +205,314 @@ app.layout = html.Div(
             min=1,
             max=12,
             step=1,
-            value=[4, 8],
+            value=DEFAULT_MONTHS,
             marks=month_marks,
             id="month-slider",
         ),
         dcc.Graph(id="graph-with-slider"),
+        # the yearly series of the selected station, the figure is drawn from it in the browser
+        dcc.Store(id="station-series"),
+        dcc.Store(
+            id="figure-template",
+            data=pio.templates[pio.templates.default].to_plotly_json(),
+        ),
     ]
 )
 
 # Step 3: Back-end
 
 
+def station_series(id, metric, selected_years, month):
+    if id not in cube.station_index:
+        # a station of the map without data
+        return pd.Series(
+            [], index=pd.Index([], name="year"), name=metric, dtype="float64"
+        )
+    key = (id, metric, tuple(selected_years), tuple(month))
+
+    def load():
+        with timings.time("data_load"):
+            return yearly_means(cube, id, metric, selected_years, month)
+
+    return series_cache.get_or_compute(key, load)
+
+
+def metrics_table(selected_years, month, reference):
+    key = ("metrics", tuple(selected_years), tuple(month), tuple(reference))
+
+    def aggregate():
+        with timings.time("aggregation"):
+            return station_metrics(cube, selected_years, month, reference)
+
+    return payload_cache.get_or_compute(key, aggregate)
+
+
+def station_map(color, metric, table):
+    """The map of the stations, colour-coded by the slope, the anomaly or the category of the metric (from table)"""
+    fig = go.Figure()
+    marker = dict(size=8, line=dict(width=1, color="DarkSlateGrey"))
+    if color == "stations":
+        # only the stations of the cube have data
+        has_data = stations.id.isin(list(cube.station_index)).to_numpy()
+    else:
+        column = "category" if color == "category" else f"{metric}_{color}"
+        values = table[column].reindex(stations.id).to_numpy()
+        has_data = pd.notna(values)
+    # the stations without data in grey, behind the others
+    fig.add_trace(
+        go.Scattergeo(
+            lon=stations.lon[~has_data],
+            lat=stations.lat[~has_data],
+            hovertext=stations.id[~has_data],
+            marker=dict(size=5, color="lightgrey"),
+            name="no data",
+        )
+    )
+    if color == "stations":
+        fig.add_trace(
+            go.Scattergeo(
+                lon=stations.lon[has_data],
+                lat=stations.lat[has_data],
+                hovertext=stations.id[has_data],
+                marker=marker,
+                name="stations",
+            )
+        )
+    else:
+        if color == "category":
+            for category, category_color in CATEGORY_COLORS.items():
+                selected = values == category
+                fig.add_trace(
+                    go.Scattergeo(
+                        lon=stations.lon[selected],
+                        lat=stations.lat[selected],
+                        hovertext=stations.id[selected],
+                        marker=dict(marker, color=category_color),
+                        name=category,
+                    )
+                )
+        else:
+            values = values.astype("float64")
+            limit = np.nanmax(np.abs(values)) if has_data.any() else 1
+            fig.add_trace(
+                go.Scattergeo(
+                    lon=stations.lon[has_data],
+                    lat=stations.lat[has_data],
+                    hovertext=stations.id[has_data],
+                    customdata=values[has_data],
+                    hovertemplate="%{hovertext}<br>"
+                    + column
+                    + ": %{customdata:.3g}<extra></extra>",
+                    marker=dict(
+                        marker,
+                        color=values[has_data],
+                        colorscale="RdBu_r",
+                        cmin=-limit,
+                        cmax=limit,
+                        colorbar=dict(title=column),
+                    ),
+                    name=column,
+                )
+            )
+    fig.update_layout(
+        title="Locations in Germany<br>(click on the map, box or lasso select to compare stations)<br>",
+        title_x=0.5,
+        geo_scope="europe",
+        geo=dict(projection_scale=7, center=dict(lat=51.5, lon=10)),
+        clickmode="event+select",
+        dragmode="lasso",
+        # keeps the zoom when the colours change
+        uirevision="map",
+    )
+    return fig
+
+
 @app.callback(
-    Output("graph-with-slider", "figure"),
+    Output("basic-interactions", "figure"),
+    Input("map-color", "value"),
+    Input("parameter", "value"),
+    Input("year-slider", "value"),
+    Input("month-slider", "value"),
+    Input("reference_slider", "value"),
+)
+@timings.timed("update_map")
+def update_map(color, parameter, selected_years, month, reference):
+    metric = VIEWS[parameter][0]
+    # only the anomaly depends on the reference period
+    key = ("map", color, metric, tuple(selected_years), tuple(month))
+    if color == "anomaly":
+        key = key + (tuple(reference),)
+    elif color == "stations":
+        key = ("map", color)
+
+    def build():
+        table = (
+            None
+            if color == "stations"
+            else metrics_table(selected_years, month, reference)
+        )
+        with timings.time("figure_build"):
+            return station_map(color, metric, table).to_dict()
+
+    return payload_cache.get_or_compute(key, build)
+
+
+def encode_array(values, dtype):
+    # a typed array as base64, decoded in the browser by decodeArray (assets/clientside.js)
+    data = np.asarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": dtype, "data": base64.b64encode(data.tobytes()).decode("ascii")}
+
+
+def series_payload(parameter, ids, selected_years, month):
+    metric, _, name, title, yaxis_title = VIEWS[parameter]
+    series_list = [station_series(id, metric, selected_years, month) for id in ids]
+    with timings.time("figure_build"):
+        return encode_payload(series_list, ids, name, title, yaxis_title)
+
+
+def encode_payload(series_list, ids, name, title, yaxis_title):
+    layout = go.Layout(
+        title=f"{title} point selected",
+        xaxis_title="year",
+        yaxis_title=yaxis_title,
+        legend_title="Legend",
+        font=dict(family="Courier New, monospace", size=12, color="#4d4d4d"),
+    ).to_plotly_json()
+    if len(ids) > 1:
+        # several stations selected on the map: one line per station
+        overlay = []
+        for id, series in zip(ids, series_list):
+            overlay.append(
+                {
+                    "name": id,
+                    "year": encode_array(series.index, "int16"),
+                    "value": encode_array(series, "float32"),
+                }
+            )
+        layout["title"] = f"{title}, points selected"
+        return {"stations": overlay, "layout": layout}
+    series = series_list[0]
+    if len(series) == 0:
+        # a station of the map without data (see station_series): said in the figure
+        layout["title"] = f"{title}, no data for station {ids[0]}"
+        layout["annotations"] = [
+            dict(
+                text=f"No data for station {ids[0]}, select a coloured station",
+                xref="paper",
+                yref="paper",
+                x=0.5,
+                y=0.5,
+                showarrow=False,
+                font=dict(size=16),
+            )
+        ]
+    return {
+        "year": encode_array(series.index, "int16"),
+        "value": encode_array(series, "float32"),
+        "name": name,
+        "layout": layout,
+    }
+
+
+@app.callback(
+    Output("station-series", "data"),
     Input("year-slider", "value"),
     Input("parameter", "value"),
     Input("basic-interactions", "clickData"),
-    Input("reference_slider", "value"),
+    Input("basic-interactions", "selectedData"),
     Input("month-slider", "value"),
 )
-def update_figure(selected_years, parameter, id, reference, month):
-    if id == None:
-        id = "01550"
+@timings.timed("update_series")
+def update_series(selected_years, parameter, id, selected, month):
+    if selected and len(selected["points"]) > 0:
+        ids = sorted(set(point["hovertext"] for point in selected["points"]))
+        # only the stations with data, when there are some
+        ids = [x for x in ids if x in cube.station_index][:MAX_OVERLAY] or ids[:1]
+    elif id == None:
+        ids = [DEFAULT_STATION]
     else:
-        id = id["points"][0]["hovertext"]
-    print("id is", id)
-    # CASE 1: parameter is temperature
-    if parameter == "temperature":
-
-        print(
-            selected_years[0],
-            selected_years[1],
-            id,
-            "reference",
-            reference[0],
-            reference[1],
-        )
-        df = pd.read_csv(f"app_data/hourly/air_temperature/1950/{id}.csv")
-        df = df[(df.year >= selected_years[0]) & (df.year <= selected_years[1])]
-        df = df[(df.month >= month[0]) & (df.month <= month[1])]
-        # print(month[0], month[1], filtered_df.month.unique())
-        df = df.groupby("year").mean()
-        ref_df = df[(df.index >= reference[0]) & (df.index <= reference[1])]
-        avg_hist = ref_df["TT_TU"].mean()
-        max_hist = ref_df["TT_TU"].max()
-        min_hist = ref_df["TT_TU"].min()
-        df["7yrs_average"] = df.TT_TU.rolling(7).mean()
-        fig = px.line(
-            x=df.index,
-            y=[
-                df.TT_TU,
-                df["7yrs_average"],
-                [max_hist for x in df.TT_TU],
-                [avg_hist for x in df.TT_TU],
-                [min_hist for x in df.TT_TU],
-            ],
-            color_discrete_sequence=["blue", "orange", "red", "green", "black"],
-            # template="simple_white",
-        )
-        newnames = {
-            "wide_variable_0": "average_temperature",
-            "wide_variable_1": "7yrs_average",
-            "wide_variable_2": "historic max",
-            "wide_variable_3": "historic average",
-            "wide_variable_4": "historic minim",
-        }
-        fig.for_each_trace(lambda t: t.update(name=newnames[t.name]))
-        fig.update_layout(
-            title="Average temperatures in Germany point selected",
-            xaxis_title="year",
-            yaxis_title="% of hours with optimal temperature for Septoria",
-            legend_title="Legend",
-            transition_duration=500,
-            font=dict(family="Courier New, monospace", size=12, color="#4d4d4d"),
-        )
-    else:
-        fig = px.line(x=[1, 2, 3], y=[3, 4, 5], title="other plot")
-    return fig
+        ids = [id["points"][0]["hovertext"]]
+    # the same payload for every user asking for the same selection
+    key = (tuple(ids), parameter, tuple(selected_years), tuple(month))
+    return payload_cache.get_or_compute(
+        key, lambda: series_payload(parameter, ids, selected_years, month)
+    )
+
+
+# The reference statistics and the 7 years average are computed in the browser (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace="station", function_name="figure"),
+    Output("graph-with-slider", "figure"),
+    Input("station-series", "data"),
+    Input("reference_slider", "value"),
+    State("figure-template", "data"),
+)
+
+
+@server.route("/cache")
+def cache_stats():
+    return {"series": series_cache.stats(), "payloads": payload_cache.stats()}
+
+
+@server.route("/metrics")
+def metrics():
+    text = timings.render({"series": series_cache, "payloads": payload_cache})
+    return text, 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+
+# Step 4: Warm-up, so that the first clicks are as fast as the next ones
+# the seconds the warm-up took, or the error that stopped it: /ready answers 503 until the first is set
+warmup_seconds = None
+warmup_error = None
+
+
+@timings.timed("warmup")
+def warmup():
+    """Computes what the page asks for when it opens, for every parameter and map colour
+
+    The callbacks are called without their timed wrapper, so /metrics counts this work under
+    the "warmup" callback and not as requests of the users.
+    """
+    # touch every page of the cube
+    cube.sums.sum()
+    cube.counts.sum()
+    for parameter in VIEWS:
+        update_series.__wrapped__(DEFAULT_YEARS, parameter, None, None, DEFAULT_MONTHS)
+        for color in ["stations", "slope", "anomaly", "category"]:
+            update_map.__wrapped__(
+                color, parameter, DEFAULT_YEARS, DEFAULT_MONTHS, DEFAULT_REFERENCE
+            )
+    # the json encoding of the figures and of the layout (plotly imports its validators lazily)
+    json.dumps(app.layout, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+# Under gunicorn --preload this runs once in the master, before the workers are forked: they
+# start with the caches filled and the modules imported, and never serve a cold request
+start = time.perf_counter()
+try:
+    warmup()
+    warmup_seconds = time.perf_counter() - start
+except Exception as e:
+    # the app still serves (computing on demand), but is not reported as ready
+    logger.exception("The warm-up failed")
+    warmup_error = f"{type(e).__name__}: {e}"
+
+
+@server.route("/ready")
+def ready():
+    if warmup_seconds is None:
+        return {"ready": False, "error": warmup_error}, 503
+    return {
+        "ready": True,
+        "warmup_seconds": round(warmup_seconds, 3),
+        "stations": len(cube.stations),
+        "metrics": cube.metrics,
+    }
+
 
+# Under gunicorn --preload this runs once in the master: the cube and the objects created so far
+# are never freed, keep the garbage collector from touching (copying) them in the workers
+gc.freeze()
 
 if __name__ == "__main__":
     app.run_server(debug=True)
@@ -0,0 +1,119 @@
+// Figures computed in the browser from the yearly series sent by the server,
+// so moving the reference slider needs no request to the server.
+
+const TYPED_ARRAYS = {int16: Int16Array, int32: Int32Array, float32: Float32Array, float64: Float64Array};
+
+function decodeArray(encoded) {
+    // {dtype, data}: the base64 of a little-endian typed array (encode_array in app.py)
+    const bytes = Uint8Array.from(atob(encoded.data), (c) => c.charCodeAt(0));
+    const values = new TYPED_ARRAYS[encoded.dtype](bytes.buffer);
+    return Array.from(values, (x) => (Number.isNaN(x) ? null : x));
+}
+
+function rollingMean(values, window) {
+    // the same as pandas rolling(window).mean(): null until the window is full
+    const result = [];
+    let sum = 0;
+    let missing = 0;
+    for (let i = 0; i < values.length; i++) {
+        if (values[i] === null) { missing++; } else { sum += values[i]; }
+        if (i >= window) {
+            const old = values[i - window];
+            if (old === null) { missing--; } else { sum -= old; }
+        }
+        result.push(i >= window - 1 && missing === 0 ? sum / window : null);
+    }
+    return result;
+}
+
+function referenceStats(years, values, reference) {
+    // max, mean and min of the years in the reference period (null when there is no year)
+    let max = -Infinity;
+    let min = Infinity;
+    let sum = 0;
+    let n = 0;
+    for (let i = 0; i < years.length; i++) {
+        if (years[i] < reference[0] || years[i] > reference[1] || values[i] === null) {
+            continue;
+        }
+        max = Math.max(max, values[i]);
+        min = Math.min(min, values[i]);
+        sum += values[i];
+        n++;
+    }
+    if (n === 0) {
+        return {max: null, avg: null, min: null};
+    }
+    return {max: max, avg: sum / n, min: min};
+}
+
+function referenceLine(y, name, color) {
+    // a horizontal line over the whole plot, labelled on the right
+    return {
+        shape: {
+            type: "line", xref: "paper", x0: 0, x1: 1, y0: y, y1: y,
+            line: {color: color, width: 2},
+        },
+        annotation: {
+            xref: "paper", x: 1, xanchor: "left", y: y, text: name,
+            showarrow: false, font: {color: color},
+        },
+    };
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    station: {
+        figure: function (series, reference, template) {
+            if (!series) {
+                return window.dash_clientside.no_update;
+            }
+            if (series.stations) {
+                // several stations selected on the map, drawn without the reference lines
+                return {
+                    data: series.stations.map((station) => ({
+                        type: "scatter",
+                        mode: "lines",
+                        x: decodeArray(station.year),
+                        y: decodeArray(station.value),
+                        name: station.name,
+                    })),
+                    layout: Object.assign({}, series.layout, {template: template}),
+                };
+            }
+            const years = decodeArray(series.year);
+            const values = decodeArray(series.value);
+            const stats = referenceStats(years, values, reference);
+            const traces = [
+                [values, series.name, "blue"],
+                [rollingMean(values, 7), "7yrs_average", "orange"],
+            ];
+            const lines = [
+                [stats.max, "historic max", "red"],
+                [stats.avg, "historic average", "green"],
+                [stats.min, "historic minim", "black"],
+            ]
+                .filter(([y]) => y !== null)
+                .map(([y, name, color]) => referenceLine(y, name, color));
+            return {
+                data: traces.map(([y, name, color]) => ({
+                    type: "scatter",
+                    mode: "lines",
+                    x: years,
+                    y: y,
+                    name: name,
+                    line: {color: color},
+                })),
+                layout: Object.assign({}, series.layout, {
+                    template: template,
+                    transition: {duration: 500},
+                    shapes: lines.map((line) => line.shape),
+                    // the "no data" message of the server (encode_payload in app.py) is kept
+                    annotations: (series.layout.annotations || []).concat(
+                        lines.map((line) => line.annotation)
+                    ),
+                    margin: {r: 140},
+                }),
+            };
+        },
+    },
+});
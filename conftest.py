@@ -0,0 +1 @@
+# Makes the repository root importable in the tests (from source_code.X import ...)
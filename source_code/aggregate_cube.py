@@ -0,0 +1,325 @@
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from source_code.dwd_schema import MISSING_VALUE
+from source_code.disease_models import (
+    combined_risk,
+    equation_fusarium_array,
+    equation_fusarium_rh_array,
+)
+from source_code.leaf_wetness import wet_hours
+
+logger = logging.getLogger(__name__)
+
+CUBE_FOLDER = "app_data/cube"
+DATA_FOLDER = "app_data/hourly"
+FIRST_YEAR = 1950
+LAST_YEAR = 2020
+
+# The parameter of the metrics computed from the hours with both temperature and humidity
+COMBINED = "combined"
+# metric: (parameter folder, column, function of the column giving the hourly values)
+# for the COMBINED metrics the column is the transformation of combined_risk (None is the product)
+METRICS: Dict[str, Tuple[str, Optional[str], Optional[Callable]]] = {
+    "TT_TU": ("air_temperature", "TT_TU", None),
+    "t_risk": ("air_temperature", "TT_TU", equation_fusarium_array),
+    "RF_STD": ("moisture", "RF_STD", None),
+    "rh_risk": ("moisture", "RF_STD", equation_fusarium_rh_array),
+    "leaf_wetness": ("moisture", "RF_STD", wet_hours),
+    "combined": (COMBINED, None, None),
+    "combined_sqrt": (COMBINED, "sqrt", None),
+    "combined_LTRH80": (COMBINED, "LTRH80", None),
+    "combined_LTRH90": (COMBINED, "LTRH90", None),
+}
+# The hourly rows of the two parameters are matched on these columns
+HOUR_COLUMNS = ["year", "month", "day", "hour"]
+
+
+class Cube(NamedTuple):
+    """Sums and counts of the hourly values by station x year x month x metric"""
+
+    stations: List[str]
+    station_index: Dict[str, int]
+    first_year: int
+    metrics: List[str]
+    sums: np.ndarray
+    counts: np.ndarray
+
+
+def station_file(station: str, parameter: str, data_folder: str = DATA_FOLDER) -> str:
+    """Returns the csv with the hourly data of a station, e.g. app_data/hourly/air_temperature/1950/01550.csv"""
+    return os.path.join(data_folder, parameter, "1950", f"{station}.csv")
+
+
+def _source_parameters(metrics: Dict[str, Tuple]) -> List[str]:
+    # the parameter folders the metrics are computed from
+    parameters = set()
+    for parameter, _, _ in metrics.values():
+        if parameter == COMBINED:
+            parameters.update(["air_temperature", "moisture"])
+        else:
+            parameters.add(parameter)
+    return sorted(parameters)
+
+
+def cube_sources(
+    stations: List[str], parameters: List[str], data_folder: str = DATA_FOLDER
+) -> Dict[str, Optional[List[int]]]:
+    """The size and modification time of the hourly file of every station and parameter
+
+    Args:
+        stations (List[str]): ids of the stations
+        parameters (List[str]): the parameter folders (e.g. ["air_temperature", "moisture"])
+        data_folder (str, optional): folder with the hourly csv files. Defaults to DATA_FOLDER.
+
+    Returns:
+        Dict[str, Optional[List[int]]]: [size, mtime in ns] by "<parameter>/<station>", None without a file
+    """
+    sources = {}
+    for station in stations:
+        for parameter in parameters:
+            path = station_file(station, parameter, data_folder)
+            if os.path.exists(path):
+                status = os.stat(path)
+                sources[f"{parameter}/{station}"] = [status.st_size, status.st_mtime_ns]
+            else:
+                sources[f"{parameter}/{station}"] = None
+    return sources
+
+
+def _read_station(
+    frames: Dict[str, pd.DataFrame],
+    station: str,
+    parameter: str,
+    data_folder: str,
+    first_year: int,
+    last_year: int,
+) -> Optional[pd.DataFrame]:
+    # the hourly data of the station, read once for all the metrics (None without a file)
+    if parameter not in frames:
+        if parameter == COMBINED:
+            t = _read_station(
+                frames, station, "air_temperature", data_folder, first_year, last_year
+            )
+            rh = _read_station(
+                frames, station, "moisture", data_folder, first_year, last_year
+            )
+            if (
+                t is None
+                or rh is None
+                or not all(
+                    column in t.columns and column in rh.columns
+                    for column in HOUR_COLUMNS
+                )
+            ):
+                frames[parameter] = None
+            else:
+                frames[parameter] = t[HOUR_COLUMNS + ["TT_TU"]].merge(
+                    rh[HOUR_COLUMNS + ["RF_STD"]], on=HOUR_COLUMNS
+                )
+        else:
+            path = station_file(station, parameter, data_folder)
+            if not os.path.exists(path):
+                frames[parameter] = None
+            else:
+                df = pd.read_csv(path)
+                df = df[(df["year"] >= first_year) & (df["year"] <= last_year)].copy()
+                for column in ["TT_TU", "RF_STD"]:
+                    if column in df.columns:
+                        df[column] = (
+                            df[column].astype("float64").replace(MISSING_VALUE, np.nan)
+                        )
+                frames[parameter] = df
+    return frames[parameter]
+
+
+def build_cube(
+    stations: List[str],
+    data_folder: str = DATA_FOLDER,
+    folder: str = CUBE_FOLDER,
+    first_year: int = FIRST_YEAR,
+    last_year: int = LAST_YEAR,
+    metrics: Dict[str, Tuple[str, Optional[str], Optional[Callable]]] = METRICS,
+):
+    """Aggregates the hourly csv files of the stations once and saves the cube
+
+    The hourly values are summed and counted by year and month (-999 and NaN are not counted),
+    so any mean over years and months can later be computed from the cube. The combined metrics
+    use the hours found in both the temperature and the moisture file. The size and modification
+    time of the files are saved with the cube, so check_cube can tell when it is stale.
+
+    Args:
+        stations (List[str]): ids of the stations
+        data_folder (str, optional): folder with the hourly csv files. Defaults to DATA_FOLDER.
+        folder (str, optional): where the cube is saved. Defaults to CUBE_FOLDER.
+        first_year (int, optional): first year of the cube. Defaults to FIRST_YEAR.
+        last_year (int, optional): last year of the cube. Defaults to LAST_YEAR.
+        metrics (Dict[str, Tuple[str, Optional[str], Optional[Callable]]], optional): the metrics. Defaults to METRICS.
+
+    Raises:
+        FileNotFoundError: if there is no hourly file for any of the stations
+    """
+    # Step 1: the hourly files, a station without a file has no data for its metrics
+    sources = cube_sources(stations, _source_parameters(metrics), data_folder)
+    missing = [key for key, source in sources.items() if source is None]
+    if len(missing) == len(sources):
+        raise FileNotFoundError(f"No hourly file in {data_folder} for the stations")
+    for key in missing:
+        logger.warning("No hourly file for %s, its metrics stay empty in the cube", key)
+    # Step 2: sum and count the hourly values
+    n_years = last_year - first_year + 1
+    shape = (len(stations), n_years, 12, len(metrics))
+    sums = np.zeros(shape, dtype="float64")
+    counts = np.zeros(shape, dtype="int32")
+    for i, station in enumerate(stations):
+        frames = {}
+        for k, (parameter, column, func) in enumerate(metrics.values()):
+            df = _read_station(
+                frames, station, parameter, data_folder, first_year, last_year
+            )
+            if df is None:
+                continue
+            if parameter == COMBINED:
+                t = df["TT_TU"].to_numpy()
+                rh = df["RF_STD"].to_numpy()
+                values = combined_risk(
+                    equation_fusarium_array(t),
+                    equation_fusarium_rh_array(rh),
+                    rh,
+                    column,
+                )
+            else:
+                values = df[column].to_numpy()
+                if func is not None:
+                    values = func(values)
+            valid = ~np.isnan(values)
+            cell = (
+                (df["year"].to_numpy() - first_year) * 12 + df["month"].to_numpy() - 1
+            )
+            sums[i, :, :, k] = np.bincount(
+                cell[valid], values[valid], n_years * 12
+            ).reshape(n_years, 12)
+            counts[i, :, :, k] = np.bincount(
+                cell[valid], minlength=n_years * 12
+            ).reshape(n_years, 12)
+    os.makedirs(folder, exist_ok=True)
+    np.save(os.path.join(folder, "sums.npy"), sums)
+    np.save(os.path.join(folder, "counts.npy"), counts)
+    with open(os.path.join(folder, "cube.json"), "w") as myfile:
+        json.dump(
+            {
+                "stations": list(stations),
+                "first_year": first_year,
+                "metrics": list(metrics),
+                "sources": sources,
+            },
+            myfile,
+        )
+
+
+def check_cube(
+    stations: List[str],
+    folder: str = CUBE_FOLDER,
+    data_folder: str = DATA_FOLDER,
+    metrics: Dict[str, Tuple[str, Optional[str], Optional[Callable]]] = METRICS,
+):
+    """Checks that the saved cube was built from the stations, metrics and hourly files
+
+    The hourly files are only compared when the data folder is there (it is not deployed with the app).
+
+    Args:
+        stations (List[str]): ids of the stations
+        folder (str, optional): where the cube is saved. Defaults to CUBE_FOLDER.
+        data_folder (str, optional): folder with the hourly csv files. Defaults to DATA_FOLDER.
+        metrics (Dict[str, Tuple[str, Optional[str], Optional[Callable]]], optional): the metrics. Defaults to METRICS.
+
+    Raises:
+        FileNotFoundError: if there is no cube
+        ValueError: if the cube is stale
+    """
+    rebuild = "build it with: python -m source_code.aggregate_cube"
+    path = os.path.join(folder, "cube.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No cube in {folder}, {rebuild}")
+    with open(path) as myfile:
+        meta = json.load(myfile)
+    problems = []
+    if meta["metrics"] != list(metrics):
+        problems.append("other metrics")
+    if meta["stations"] != list(stations):
+        problems.append("other stations")
+    if os.path.exists(data_folder):
+        sources = cube_sources(stations, _source_parameters(metrics), data_folder)
+        saved = meta.get("sources", {})
+        changed = [key for key, source in sources.items() if saved.get(key) != source]
+        if changed:
+            problems.append(
+                f"{len(changed)} changed hourly file(s), e.g. {changed[:3]}"
+            )
+    if problems:
+        raise ValueError(
+            f"The cube in {folder} is stale ({', '.join(problems)}), {rebuild}"
+        )
+
+
+def load_cube(folder: str = CUBE_FOLDER, mmap_mode: Optional[str] = "r") -> Cube:
+    """Loads the cube saved by build_cube, memory-mapped by default
+
+    Args:
+        folder (str, optional): where the cube is saved. Defaults to CUBE_FOLDER.
+        mmap_mode (Optional[str], optional): passed to np.load, None reads the arrays into memory. Defaults to "r".
+
+    Returns:
+        Cube: the cube
+    """
+    with open(os.path.join(folder, "cube.json")) as myfile:
+        meta = json.load(myfile)
+    return Cube(
+        stations=meta["stations"],
+        station_index={station: i for i, station in enumerate(meta["stations"])},
+        first_year=meta["first_year"],
+        metrics=meta["metrics"],
+        sums=np.load(os.path.join(folder, "sums.npy"), mmap_mode=mmap_mode),
+        counts=np.load(os.path.join(folder, "counts.npy"), mmap_mode=mmap_mode),
+    )
+
+
+def yearly_means(
+    cube: Cube,
+    station: str,
+    metric: str,
+    years: Tuple[int, int],
+    months: Tuple[int, int],
+) -> pd.Series:
+    """Mean of the hourly values of the metric in the months, for every year
+
+    Args:
+        cube (Cube): the cube
+        station (str): id of the station
+        metric (str): the metric (e.g. "TT_TU")
+        years (Tuple[int, int]): first and last year
+        months (Tuple[int, int]): first and last month (1 - 12)
+
+    Returns:
+        pd.Series: the means indexed by year, only the years with data
+    """
+    i = cube.station_index[station]
+    k = cube.metrics.index(metric)
+    first = max(years[0] - cube.first_year, 0)
+    last = min(years[1] - cube.first_year, cube.sums.shape[1] - 1)
+    sums = cube.sums[i, first : last + 1, months[0] - 1 : months[1], k].sum(axis=1)
+    counts = cube.counts[i, first : last + 1, months[0] - 1 : months[1], k].sum(axis=1)
+    index = pd.Index(np.arange(first, last + 1) + cube.first_year, name="year")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = pd.Series(sums / counts, index=index, name=metric)
+    return means[counts > 0]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    coordinates = pd.read_csv("app_data/coordinates.csv", dtype={"id": str})
+    build_cube(list(coordinates.id.str.zfill(5).unique()))
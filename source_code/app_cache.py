@@ -0,0 +1,102 @@
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+def size_of(value: Any) -> int:
+    """Approximate memory used by a cached value, in bytes
+
+    The dicts and lists (e.g. a figure dict) are walked without serialising them: the arrays count
+    their nbytes, the strings (e.g. base64 payloads) their length and the numbers 8 bytes.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(size_of(key) + size_of(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(size_of(item) for item in value)
+    if value is None or isinstance(value, (bool, int, float)):
+        return 8
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """A thread-safe least recently used cache, bounded by the number of entries and by their size
+
+    Args:
+        max_items (int, optional): maximum number of entries. Defaults to 256.
+        max_bytes (int, optional): maximum total size of the entries (see size_of). Defaults to 64 MB.
+    """
+
+    def __init__(self, max_items: int = 256, max_bytes: int = 64 * 2**20):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value (and marks it as recently used), or default on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any):
+        """Caches the value, evicting the least recently used entries when over the limits"""
+        size = size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._entries) > self.max_items or self._bytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Returns the cached value, computing and caching it on a miss
+
+        The value is computed outside of the lock, so a slow computation does not block the other threads.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,123 @@
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from source_code.app_cache import LRUCache
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Timings:
+    """Thread-safe histograms of the time spent in the callbacks, by callback and phase
+
+    The callback is set for the current thread by the timed decorator, so the phases measured
+    deeper in the call (e.g. the data load) are counted for the callback that asked for them.
+
+    Args:
+        buckets (Iterable[float], optional): upper bounds of the buckets in seconds. Defaults to BUCKETS.
+    """
+
+    def __init__(self, buckets: Iterable[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (callback, phase): [count of every bucket..., count, sum]
+        self._histograms: Dict[Tuple[str, str], list] = {}
+
+    @property
+    def callback(self) -> str:
+        """The callback running in the current thread"""
+        return getattr(self._local, "callback", "none")
+
+    def observe(self, phase: str, seconds: float, callback: Optional[str] = None):
+        key = (callback or self.callback, phase)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def time(self, phase: str):
+        """Measures the block as the phase of the current callback"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator measuring the whole callback as the "total" phase"""
+
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                previous = getattr(self._local, "callback", None)
+                self._local.callback = name
+                try:
+                    with self.time("total"):
+                        return func(*args, **kwargs)
+                finally:
+                    self._local.callback = previous
+
+            return wrapper
+
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self, caches: Optional[Dict[str, LRUCache]] = None) -> str:
+        """The histograms (and the counters of the caches) in the Prometheus text format
+
+        Args:
+            caches (Optional[Dict[str, LRUCache]], optional): the caches by name. Defaults to None.
+
+        Returns:
+            str: the text for the /metrics endpoint
+        """
+        lines = [
+            "# HELP app_callback_seconds Time spent in the callbacks, by phase",
+            "# TYPE app_callback_seconds histogram",
+        ]
+        with self._lock:
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+        for (callback, phase), histogram in sorted(histograms.items()):
+            labels = f'callback="{callback}",phase="{phase}"'
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(
+                    f'app_callback_seconds_bucket{{{labels},le="{bound}"}} {count}'
+                )
+            lines.append(
+                f'app_callback_seconds_bucket{{{labels},le="+Inf"}} {histogram[-2]}'
+            )
+            lines.append(f"app_callback_seconds_sum{{{labels}}} {histogram[-1]}")
+            lines.append(f"app_callback_seconds_count{{{labels}}} {histogram[-2]}")
+        if caches:
+            stats = {name: cache.stats() for name, cache in caches.items()}
+            for counter, help_text in [
+                ("hits", "Lookups found in the cache"),
+                ("misses", "Lookups not found in the cache"),
+                ("evictions", "Entries evicted from the cache"),
+            ]:
+                lines.append(f"# HELP app_cache_{counter}_total {help_text}")
+                lines.append(f"# TYPE app_cache_{counter}_total counter")
+                for name, values in stats.items():
+                    lines.append(
+                        f'app_cache_{counter}_total{{cache="{name}"}} {values[counter]}'
+                    )
+            for gauge, help_text in [
+                ("items", "Entries in the cache"),
+                ("bytes", "Approximate size of the entries in the cache"),
+            ]:
+                lines.append(f"# HELP app_cache_{gauge} {help_text}")
+                lines.append(f"# TYPE app_cache_{gauge} gauge")
+                for name, values in stats.items():
+                    lines.append(f'app_cache_{gauge}{{cache="{name}"}} {values[gauge]}')
+        return "\n".join(lines) + "\n"
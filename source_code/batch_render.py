@@ -0,0 +1,271 @@
+import os
+import json
+import hashlib
+import inspect
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from source_code.fusarium import (
+    combined_risk_fusarium_data,
+    combined_risk_fusarium_figure,
+    draw_combined_risk_fusarium,
+    draw_risk_fusarium,
+    risk_fusarium_data,
+    risk_fusarium_figure,
+)
+from source_code.plot_functions import (
+    draw_dryness,
+    draw_lw_RHt,
+    draw_optimal_temperature,
+    dryness_data,
+    dryness_figure,
+    lw_RHt_data,
+    lw_RHt_figure,
+    optimal_temperature_data,
+    optimal_temperature_figure,
+)
+from source_code.station_store import load_store, stored_source, stored_stations
+
+OUTPUT_ROOT = "results/plots/stations"
+MANIFEST_FILE = "manifest.json"
+DPI = 100
+# Changed when the figures are drawn differently, so that all of them are rendered again
+RENDER_VERSION = 2
+
+
+class PlotSpec(NamedTuple):
+    """A figure drawn for every station: the data is computed, then drawn on a reused figure"""
+
+    # the hourly parameters read from the store, in the order the data function takes them
+    parameters: List[str]
+    # function of the hourly data (and the options) returning what draw needs
+    data: Callable
+    # function of the options returning the figure and axes without the station data
+    figure: Callable
+    # function drawing the data on the axes of the figure
+    draw: Callable
+
+
+PLOTS: Dict[str, PlotSpec] = {
+    "optimal_temperature": PlotSpec(
+        ["air_temperature"],
+        optimal_temperature_data,
+        optimal_temperature_figure,
+        draw_optimal_temperature,
+    ),
+    "lw_RHt": PlotSpec(["moisture"], lw_RHt_data, lw_RHt_figure, draw_lw_RHt),
+    "dryness": PlotSpec(["moisture"], dryness_data, dryness_figure, draw_dryness),
+    "risk_fusarium": PlotSpec(
+        ["air_temperature", "moisture"],
+        risk_fusarium_data,
+        risk_fusarium_figure,
+        draw_risk_fusarium,
+    ),
+    "combined_risk_fusarium": PlotSpec(
+        ["air_temperature", "moisture"],
+        combined_risk_fusarium_data,
+        combined_risk_fusarium_figure,
+        draw_combined_risk_fusarium,
+    ),
+}
+
+# The figures of the current process by kind and options, with the artists of the empty figure.
+# They are headless (Agg, unknown to pyplot), so the batch never changes the backend of the caller
+_FIGURES: Dict[Tuple[str, str], Tuple] = {}
+
+
+def _accepted(func: Callable, options: Dict) -> Dict:
+    # the options that are arguments of the function
+    parameters = inspect.signature(func).parameters
+    return {key: value for key, value in options.items() if key in parameters}
+
+
+def _json_default(value):
+    # the options that are not plain values, e.g. the phenology windows
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(pd.util.hash_pandas_object(value, index=False).sum())
+    return repr(value)
+
+
+def station_output(kind: str, station: str, root: str = OUTPUT_ROOT) -> str:
+    """Returns the png of a station: <root>/<kind>/<station>.png"""
+    return os.path.join(root, kind, f"{station}.png")
+
+
+def fingerprint(kind: str, station: str, options: Dict) -> Optional[str]:
+    """The hash of everything the figure of a station is made from
+
+    The stored data of a station only changes with the archive it comes from, so the names
+    of the archives stand for the data.
+
+    Args:
+        kind (str): the figure, a key of PLOTS
+        station (str): id of the weather station (e.g. "01639")
+        options (Dict): the arguments of the data and figure functions
+
+    Returns:
+        Optional[str]: the hash, or None if a parameter of the station is not stored
+    """
+    sources = {
+        parameter: stored_source("hourly", parameter, station)
+        for parameter in PLOTS[kind].parameters
+    }
+    if any(source is None for source in sources.values()):
+        return None
+    content = json.dumps(
+        {
+            "version": RENDER_VERSION,
+            "kind": kind,
+            "sources": sources,
+            "options": options,
+        },
+        sort_keys=True,
+        default=_json_default,
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _template(kind: str, options: Dict) -> Tuple:
+    # the empty figure of the kind, created once per process and options
+    figure_options = _accepted(PLOTS[kind].figure, options)
+    key = (kind, json.dumps(figure_options, sort_keys=True, default=_json_default))
+    if key not in _FIGURES:
+        fig, axes = PLOTS[kind].figure(**figure_options, headless=True)
+        artists = [set(ax.get_children()) for ax in axes]
+        _FIGURES[key] = (fig, axes, artists)
+    return _FIGURES[key]
+
+
+def _clear(axes, artists):
+    # removes what was drawn for the previous station, keeping the empty figure
+    for ax, template in zip(axes, artists):
+        legend = ax.get_legend()
+        if legend is not None:
+            legend.remove()
+        for artist in ax.get_children():
+            if artist not in template:
+                artist.remove()
+        # the lines take the same colors as on a new figure
+        ax.set_prop_cycle(None)
+        ax.relim()
+        ax.autoscale_view()
+
+
+def render_station(kind: str, station: str, options: Dict, path: str):
+    """Computes and draws the figure of one station, and saves it as png
+
+    Args:
+        kind (str): the figure, a key of PLOTS
+        station (str): id of the weather station (e.g. "01639")
+        options (Dict): the arguments of the data and figure functions
+        path (str): the png file
+    """
+    spec = PLOTS[kind]
+    # Step 1: compute
+    frames = [
+        load_store("hourly", parameter, stations=[station])
+        for parameter in spec.parameters
+    ]
+    data = spec.data(*frames, **_accepted(spec.data, options))
+    # Step 2: draw on the figure of the previous station
+    fig, axes, artists = _template(kind, options)
+    _clear(axes, artists)
+    spec.draw(axes, data)
+    # Step 3: save, the png only appears once it is complete
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    fig.savefig(temporary, dpi=DPI, format="png")
+    os.replace(temporary, path)
+
+
+def _render_worker(args: Tuple[str, str, Dict, str]) -> str:
+    kind, station, options, path = args
+    render_station(kind, station, options, path)
+    return station
+
+
+def read_manifest(kind: str, root: str = OUTPUT_ROOT) -> Dict[str, str]:
+    """Returns the fingerprints of the rendered figures of a kind, by station"""
+    path = os.path.join(root, kind, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as myfile:
+        return json.load(myfile)
+
+
+def _write_manifest(manifest: Dict[str, str], kind: str, root: str):
+    path = os.path.join(root, kind, MANIFEST_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as myfile:
+        json.dump(manifest, myfile, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def render_stations(
+    kind: str,
+    options: Dict,
+    stations: Optional[List[str]] = None,
+    root: str = OUTPUT_ROOT,
+    n_workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, List[str]]:
+    """Renders the figure of every station without showing it, in a pool of processes
+
+    The figures are written to <root>/<kind>/<station>.png. The manifest next to them keeps the
+    fingerprint of every figure, and the stations with the same fingerprint as last time are
+    skipped. Every process creates the empty figure once and only draws the data of each station.
+
+    Args:
+        kind (str): the figure, a key of PLOTS
+        options (Dict): the arguments of the data and figure functions, e.g. for
+            "combined_risk_fusarium": hist_start, hist_end, start_dd_mm, end_dd_mm, moving_average and transf
+        stations (Optional[List[str]], optional): ids of the stations. Defaults to None (all the stored stations).
+        root (str, optional): folder of the figures. Defaults to OUTPUT_ROOT.
+        n_workers (Optional[int], optional): number of processes, 1 renders in this process. Defaults to None (the number of CPUs).
+        force (bool, optional): renders the stations even if nothing changed. Defaults to False.
+
+    Returns:
+        Dict[str, List[str]]: the stations "rendered", "skipped" (unchanged) and "missing" (not stored)
+    """
+    if kind not in PLOTS:
+        raise ValueError(f"Unknown figure {kind}, expected one of {list(PLOTS)}")
+    # Step 1: the stations whose figure has to be rendered
+    if stations is None:
+        stored = [
+            set(stored_stations("hourly", parameter))
+            for parameter in PLOTS[kind].parameters
+        ]
+        stations = sorted(set.intersection(*stored))
+    manifest = read_manifest(kind, root)
+    result = {"rendered": [], "skipped": [], "missing": []}
+    todo = {}
+    for station in stations:
+        key = fingerprint(kind, station, options)
+        path = station_output(kind, station, root)
+        if key is None:
+            result["missing"].append(station)
+        elif not force and manifest.get(station) == key and os.path.exists(path):
+            result["skipped"].append(station)
+        else:
+            todo[station] = (key, path)
+    # Step 2: render, the manifest only records the figures that were written
+    jobs = [(kind, station, options, path) for station, (_, path) in todo.items()]
+    executor = None
+    try:
+        if n_workers == 1:
+            done = map(_render_worker, jobs)
+        else:
+            executor = ProcessPoolExecutor(max_workers=n_workers)
+            done = executor.map(_render_worker, jobs)
+        for station in done:
+            manifest[station] = todo[station][0]
+            result["rendered"].append(station)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        else:
+            # frees the figures kept between the stations in this process
+            _FIGURES.clear()
+        _write_manifest(manifest, kind, root)
+    return result
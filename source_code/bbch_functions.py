@@ -1,34 +1,203 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, date, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from source_code.station_matching import weather_windows
 
-def quantile_date_stage_crop(crop: str, quantile: float, stage: int):
-    if crop not in ["mais", "wheat"]:
+BBCH_FOLDER = "downloads/bbch"
+CROPS = ["mais", "wheat"]
+
+
+class PhenologyIndex(NamedTuple):
+    """The observed days of the year (Jultag) of a crop, sorted, by stage (Phase_id)"""
+
+    # stage: the days of all the observations
+    days: Dict[int, np.ndarray]
+    # (stage, year): the days of the observations of the year
+    by_year: Dict[Tuple[int, int], np.ndarray]
+    # (stage, station): the days of the observations of the station (e.g. "01639")
+    by_station: Dict[Tuple[int, str], np.ndarray]
+    # (stage, station, year): the days of the observations of the station in the year
+    by_station_year: Dict[Tuple[int, str, int], np.ndarray]
+    # one row per observation: Stations_id, Referenzjahr, Phase_id and Jultag
+    observations: pd.DataFrame
+
+
+def bbch_path(crop: str, common_ids: bool = False) -> str:
+    """Returns the csv of a crop: downloads/bbch/bbch_<crop>.csv or bbch_<crop>_common_ids.csv"""
+    suffix = "_common_ids" if common_ids else ""
+    return f"{BBCH_FOLDER}/bbch_{crop}{suffix}.csv"
+
+
+@lru_cache(maxsize=None)
+def load_bbch(crop: str, common_ids: bool = False) -> pd.DataFrame:
+    """Loads the phenology observations of a crop once
+
+    Args:
+        crop (str): "mais" or "wheat"
+        common_ids (bool, optional): only the stations with weather data (the *_common_ids.csv files). Defaults to False.
+
+    Returns:
+        pd.DataFrame: the Stations_id (zero padded, e.g. "01639"), Referenzjahr, Phase_id and Jultag columns
+    """
+    if crop not in CROPS:
         raise ValueError("Crop not found")
-    bbch = pd.read_csv("downloads/bbch/bbch_" + crop + ".csv", encoding="latin1")
-    stage_date = bbch[bbch["Phase_id"] == stage]
-    arr = stage_date.Jultag.to_numpy()
-    day_num = str(int(np.quantile(arr, quantile)))
-    # adjusting day num
-    day_num.rjust(3 + len(day_num), "0")
+    bbch = pd.read_csv(
+        bbch_path(crop, common_ids),
+        encoding="latin1",
+        usecols=["Stations_id", "Referenzjahr", "Phase_id", "Jultag"],
+        dtype={"Stations_id": str},
+    )
+    bbch["Stations_id"] = bbch["Stations_id"].str.strip().str.zfill(5)
+    return bbch
+
 
-    # Initialize year
-    year = "1950"
+@lru_cache(maxsize=None)
+def phenology_index(crop: str, common_ids: bool = False) -> PhenologyIndex:
+    """Builds the sorted days of every stage once, in total, by year and by station
 
-    # Initializing start date
-    strt_date = date(int(year), 1, 1)
+    Args:
+        crop (str): "mais" or "wheat"
+        common_ids (bool, optional): only the stations with weather data (the *_common_ids.csv files). Defaults to False.
+
+    Returns:
+        PhenologyIndex: the index
+    """
+    bbch = load_bbch(crop, common_ids)
+    bbch = bbch.sort_values(["Phase_id", "Jultag"], kind="stable")
+
+    def sorted_days(keys):
+        return {
+            key: group.to_numpy()
+            for key, group in bbch.groupby(keys, sort=False)["Jultag"]
+        }
+
+    return PhenologyIndex(
+        days=sorted_days("Phase_id"),
+        by_year=sorted_days(["Phase_id", "Referenzjahr"]),
+        by_station=sorted_days(["Phase_id", "Stations_id"]),
+        by_station_year=sorted_days(["Phase_id", "Stations_id", "Referenzjahr"]),
+        observations=bbch.reset_index(drop=True),
+    )
 
-    # converting to date
+
+def stage_quantiles(
+    crop: str,
+    stage: int,
+    quantiles,
+    year: Optional[int] = None,
+    station: Optional[str] = None,
+    common_ids: bool = False,
+) -> np.ndarray:
+    """The quantiles of the day of the year a stage is reached
+
+    Args:
+        crop (str): "mais" or "wheat"
+        stage (int): the Phase_id (e.g. 24 = harvested, 19 = bbch75)
+        quantiles: a quantile or an array of quantiles (0 - 1)
+        year (Optional[int], optional): only the observations of the year. Defaults to None.
+        station (Optional[str], optional): only the observations of the station. Defaults to None.
+        common_ids (bool, optional): only the stations with weather data (the *_common_ids.csv files). Defaults to False.
+
+    Returns:
+        np.ndarray: the days of the year, as np.quantile gives them (NaN without observations)
+    """
+    index = phenology_index(crop, common_ids)
+    if year is not None and station is not None:
+        days = index.by_station_year.get((stage, station, year), np.array([]))
+    elif year is not None:
+        days = index.by_year.get((stage, year), np.array([]))
+    elif station is not None:
+        days = index.by_station.get((stage, station), np.array([]))
+    else:
+        days = index.days.get(stage, np.array([]))
+    if len(days) == 0:
+        return np.full(np.shape(quantiles), np.nan)
+    return np.quantile(days, quantiles)
+
+
+def day_to_dd_mm(day_num) -> str:
+    """Converts a day of the year to the "dd.mm" format (in 1950, not a leap year)"""
+    strt_date = date(1950, 1, 1)
     res_date = strt_date + timedelta(days=int(day_num) - 1)
-    res = res_date.strftime("%d.%m")
-    return res
+    return res_date.strftime("%d.%m")
+
+
+def quantile_date_stage_crop(
+    crop: str,
+    quantile: Union[float, Iterable[float]],
+    stage: int,
+    common_ids: bool = False,
+) -> Union[str, List[str]]:
+    """The date (dd.mm) by which the quantile of the observations reached the stage
+
+    Args:
+        crop (str): "mais" or "wheat"
+        quantile (Union[float, Iterable[float]]): a quantile or several quantiles (0 - 1)
+        stage (int): the Phase_id (e.g. 24 = harvested, 19 = bbch75)
+        common_ids (bool, optional): only the stations with weather data (the *_common_ids.csv files). Defaults to False.
+
+    Returns:
+        Union[str, List[str]]: the date, or one date for every quantile
+    """
+    days = stage_quantiles(crop, stage, quantile, common_ids=common_ids)
+    if np.ndim(days) == 0:
+        return day_to_dd_mm(days)
+    return [day_to_dd_mm(day) for day in days]
+
+
+def phenology_windows(
+    start: Tuple[str, int] = ("mais", 24),
+    end: Tuple[str, int] = ("wheat", 19),
+    common_ids: bool = True,
+    matches: Optional[pd.DataFrame] = None,
+    start_year_offset: int = 1,
+) -> pd.DataFrame:
+    """The window of every station and season between two observed stages, e.g. maize harvest to wheat BBCH75
+
+    The season is the year of the end stage, and the start stage is taken from start_year_offset
+    years before: by default the maize harvest of 2006 and BBCH75 of 2007 make the season 2007.
+
+    Args:
+        start (Tuple[str, int], optional): crop and stage starting the window. Defaults to ("mais", 24), harvested.
+        end (Tuple[str, int], optional): crop and stage ending the window. Defaults to ("wheat", 19), bbch75.
+        common_ids (bool, optional): only the stations with weather data (the *_common_ids.csv files). Defaults to True.
+        matches (Optional[pd.DataFrame], optional): the weather stations of the reporters
+            (station_matching.nearest_stations), the windows are then given for the weather stations. Defaults to None.
+        start_year_offset (int, optional): how many years before the end stage the start stage is observed,
+            0 for both stages in the same year. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: the STATIONS_ID, year (the season), start_year, start_day and end_day columns (days of the year),
+        for the stations and seasons where both stages were observed (see general_functions.window_seasons)
+    """
+    days = []
+    for (crop, stage), column, offset in [
+        (start, "start_day", start_year_offset),
+        (end, "end_day", 0),
+    ]:
+        observations = phenology_index(crop, common_ids).observations
+        observations = observations[observations["Phase_id"] == stage]
+        # the first observation if a stage was reported twice, keyed by the season
+        first = observations.groupby(["Stations_id", "Referenzjahr"])["Jultag"].min()
+        first.index = first.index.set_levels(first.index.levels[1] + offset, level=1)
+        days.append(first.rename(column))
+    windows = pd.concat(days, axis=1, join="inner").reset_index()
+    windows = windows.rename(
+        columns={"Stations_id": "STATIONS_ID", "Referenzjahr": "year"}
+    )
+    windows.insert(2, "start_year", windows["year"] - start_year_offset)
+    if matches is not None:
+        windows = weather_windows(windows, matches)
+    return windows
 
 
 def plot_harvest_date_mais():
-    bbch_mais = pd.read_csv("downloads/bbch/bbch_mais.csv", encoding="latin1")
+    bbch_mais = load_bbch("mais")
     harvest_date = bbch_mais[(bbch_mais["Phase_id"] == 24)]
     plt.figure(figsize=(15, 7))
     sns.boxenplot(x=harvest_date.Referenzjahr, y=harvest_date.Jultag)
@@ -50,7 +219,7 @@ def plot_stage_date_wheat(stage: int):
     # 19 = bbch75
     # 23 = begin harvesting
     # 24 = harvested
-    bbch_mais = pd.read_csv("downloads/bbch/bbch_wheat.csv", encoding="latin1")
+    bbch_mais = load_bbch("wheat")
     harvest_date = bbch_mais[(bbch_mais["Phase_id"] == stage)]
     plt.figure(figsize=(15, 7))
     sns.boxenplot(x=harvest_date.Referenzjahr, y=harvest_date.Jultag)
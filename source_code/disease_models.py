@@ -0,0 +1,182 @@
+import re
+import numpy as np
+import pandas as pd
+from functools import partial
+from typing import Callable, Dict, Optional, Union
+
+CONV_FACT = 96191163.12099737
+
+
+def equation_fusarium(t: float):
+    tmin = 5
+    tmax = 30
+    if t <= tmin:
+        return 0
+    if t >= tmax:
+        return 0
+    b, c = 17.2, 10.5
+    teq = (t - tmin) / (tmax - tmin)
+    y = (teq**b) * ((1 - teq) ** c) * CONV_FACT
+
+    return y
+
+
+def equation_fusarium_t_2(t: float):
+    return 1
+
+
+def equation_fusarium_rh(rh: float) -> float:
+
+    if rh > 100:
+        rh = 100
+    c = 0.850
+    y = c ** (100 - rh)
+    return y * 1
+
+
+def _per_distinct_value(func: Callable, values: np.ndarray) -> np.ndarray:
+    # func of a Python float, computed once for every distinct value (NaN stays NaN), so the
+    # powers are the ones of the scalar models: numpy's SIMD power can round differently.
+    # The measurements have a resolution of 0.1, so there are a few hundred distinct values.
+    codes, uniques = pd.factorize(values)
+    results = np.array([func(x) for x in uniques.tolist()] + [np.nan], dtype="float64")
+    return results[codes]
+
+
+def equation_fusarium_array(t: np.ndarray) -> np.ndarray:
+    """equation_fusarium for a whole array of temperatures, NaN stays NaN
+
+    The same operations in the same order as equation_fusarium, so every value is bit-for-bit equal.
+
+    Args:
+        t (np.ndarray): air temperatures (degrees Celsius)
+
+    Returns:
+        np.ndarray: the temperature risk of every value
+    """
+    tmin = 5
+    tmax = 30
+    b, c = 17.2, 10.5
+    t = np.asarray(t, dtype="float64")
+    y = np.where(np.isnan(t), np.nan, 0.0)
+    inside = (t > tmin) & (t < tmax)
+    teq = (t[inside] - tmin) / (tmax - tmin)
+    y[inside] = _per_distinct_value(
+        lambda teq: (teq**b) * ((1 - teq) ** c) * CONV_FACT, teq
+    )
+    return y
+
+
+def equation_fusarium_t_2_array(t: np.ndarray) -> np.ndarray:
+    return np.ones(np.shape(t))
+
+
+def equation_fusarium_rh_array(rh: np.ndarray) -> np.ndarray:
+    """equation_fusarium_rh for a whole array of relative humidities, NaN stays NaN
+
+    The same operations in the same order as equation_fusarium_rh, so every value is bit-for-bit equal.
+
+    Args:
+        rh (np.ndarray): relative humidities (%)
+
+    Returns:
+        np.ndarray: the humidity risk of every value
+    """
+    rh = np.minimum(np.asarray(rh, dtype="float64"), 100)
+    c = 0.850
+    return _per_distinct_value(lambda rh: c ** (100 - rh), rh)
+
+
+# The array version of every scalar model
+ARRAY_MODELS = {
+    equation_fusarium: equation_fusarium_array,
+    equation_fusarium_t_2: equation_fusarium_t_2_array,
+    equation_fusarium_rh: equation_fusarium_rh_array,
+}
+
+
+def apply_model(func: Callable, values) -> np.ndarray:
+    """Applies a model to an array (or Series) of values
+
+    The array version of the model is used when there is one (see ARRAY_MODELS),
+    any other function is applied value by value.
+
+    Args:
+        func (Callable): the model, e.g. equation_fusarium or equation_fusarium_array
+        values: the input values
+
+    Returns:
+        np.ndarray: the model output for every value
+    """
+    values = np.asarray(values, dtype="float64")
+    if func in ARRAY_MODELS.values():
+        return func(values)
+    if func in ARRAY_MODELS:
+        return ARRAY_MODELS[func](values)
+    return np.array([func(x) for x in values], dtype="float64")
+
+
+def combine_product(t_risk: np.ndarray, rh_risk: np.ndarray, rh: np.ndarray):
+    return t_risk * rh_risk
+
+
+def combine_sqrt(t_risk: np.ndarray, rh_risk: np.ndarray, rh: np.ndarray):
+    return np.sqrt(t_risk * rh_risk)
+
+
+def combine_rh_threshold(
+    t_risk: np.ndarray, rh_risk: np.ndarray, rh: np.ndarray, threshold: float
+):
+    # the temperature risk counts only in the hours with RH above the threshold
+    return np.where(rh > threshold, t_risk, 0.0)
+
+
+# The ways to combine the temperature and the humidity risk, by the name of the transformation
+COMBINATIONS: Dict[Optional[str], Callable] = {
+    None: combine_product,
+    "sqrt": combine_sqrt,
+    "LTRH80": partial(combine_rh_threshold, threshold=80),
+    "LTRH90": partial(combine_rh_threshold, threshold=90),
+}
+
+
+def register_combination(name: str, func: Callable):
+    """Adds a transformation that can then be used as transf in the combined models
+
+    Args:
+        name (str): the name of the transformation
+        func (Callable): function of the arrays (t_risk, rh_risk, rh) returning the combined risk
+    """
+    COMBINATIONS[name] = func
+
+
+def combined_risk(
+    t_risk, rh_risk, rh, transf: Optional[Union[str, Callable]] = None
+) -> np.ndarray:
+    """Combines the temperature and the humidity risk of every hour
+
+    Args:
+        t_risk: the temperature risk
+        rh_risk: the humidity risk
+        rh: the relative humidity (%)
+        transf (Optional[Union[str, Callable]], optional): the transformation: None (product), "sqrt",
+            "LTRH<threshold>" (e.g. "LTRH85"), a registered name, a function of (t_risk, rh_risk, rh)
+            or an expression of t_risk, rh_risk and rh (e.g. "t_risk * rh_risk ** 2"). Defaults to None.
+
+    Returns:
+        np.ndarray: the combined risk
+    """
+    t_risk = np.asarray(t_risk, dtype="float64")
+    rh_risk = np.asarray(rh_risk, dtype="float64")
+    rh = np.asarray(rh, dtype="float64")
+    if callable(transf):
+        return np.asarray(transf(t_risk, rh_risk, rh), dtype="float64")
+    if transf in COMBINATIONS:
+        return COMBINATIONS[transf](t_risk, rh_risk, rh)
+    threshold = re.fullmatch(r"LTRH(\d+(?:\.\d+)?)", transf)
+    if threshold:
+        return combine_rh_threshold(t_risk, rh_risk, rh, float(threshold.group(1)))
+    result = pd.eval(
+        transf, local_dict={"t_risk": t_risk, "rh_risk": rh_risk, "rh": rh}
+    )
+    return np.broadcast_to(np.asarray(result, dtype="float64"), t_risk.shape)
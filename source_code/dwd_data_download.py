@@ -1,15 +1,246 @@
 from typing import Optional
-from zipfile import ZipFile
-from os.path import exists
-from typing import Tuple
+from zipfile import ZipFile, BadZipFile
+from os.path import exists, getsize
+from typing import Dict, Iterator, List, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+import os
 import re
+import logging
+import time as clock
 import pandas as pd
-import wget
+import requests
 
 # from dwd_data_explore import get_links, common_stations
 
 
-from source_code.general_functions import get_date
+from source_code.dwd_index import index_frame
+from source_code.dwd_schema import (
+    add_time_columns,
+    date_bounds,
+    iter_product,
+    station_categories,
+    time_columns,
+)
+from source_code.station_store import load_store, stored_source, write_station
+
+logger = logging.getLogger(__name__)
+
+
+def is_complete_archive(
+    path: str, expected_size: Optional[int] = None, check_crc: bool = False
+) -> bool:
+    """Checks if a downloaded archive is whole and readable
+
+    Args:
+        path (str): path of the zip file
+        expected_size (Optional[int], optional): size in bytes announced by the server. Defaults to None.
+        check_crc (bool, optional): if true, the CRC of every member is verified (reads the whole file). Defaults to False.
+
+    Returns:
+        bool: True if the archive can be used
+    """
+    if not exists(path):
+        return False
+    if expected_size is not None and getsize(path) != expected_size:
+        return False
+    try:
+        with ZipFile(path) as myzip:
+            if check_crc:
+                return myzip.testzip() is None
+    except (BadZipFile, OSError):
+        return False
+    return True
+
+
+def download_file(
+    link: str,
+    folder: str,
+    expected_size: Optional[int] = None,
+    retries: int = 3,
+    backoff: float = 1.0,
+    timeout: float = 60,
+) -> str:
+    """Downloads one file into the folder, skipping it if a complete copy is already there
+
+    The file is first written to a ".part" file and renamed only after its size and CRC were checked,
+    so an interrupted download never leaves a broken archive behind.
+
+    Args:
+        link (str): url of the file
+        folder (str): destination folder (e.g. "downloads/hourly/air_temperature/")
+        expected_size (Optional[int], optional): size from the DWD listing; if None the Content-Length header is used. Defaults to None.
+        retries (int, optional): number of retries after a failed attempt. Defaults to 3.
+        backoff (float, optional): seconds to wait before the first retry, doubled on every retry. Defaults to 1.0.
+        timeout (float, optional): timeout in seconds for the connection. Defaults to 60.
+
+    Raises:
+        IOError: if the file could not be downloaded after all the retries
+
+    Returns:
+        str: the path of the downloaded file
+    """
+    destination = os.path.join(folder, str.split(link, "/")[-1])
+    if is_complete_archive(destination, expected_size):
+        return destination
+    part = destination + ".part"
+    for attempt in range(retries + 1):
+        try:
+            with requests.get(link, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                size = expected_size
+                if size is None and "Content-Length" in response.headers:
+                    size = int(response.headers["Content-Length"])
+                with open(part, "wb") as myfile:
+                    for chunk in response.iter_content(chunk_size=1 << 16):
+                        myfile.write(chunk)
+            if not is_complete_archive(part, size, check_crc=True):
+                raise IOError("Incomplete or corrupt download: " + link)
+            os.replace(part, destination)
+            return destination
+        except (requests.exceptions.RequestException, OSError) as e:
+            if exists(part):
+                os.remove(part)
+            if attempt == retries:
+                raise IOError("Not able to download " + link) from e
+            clock.sleep(backoff * 2**attempt)
+    return destination
+
+
+def download_files(
+    links: List[str],
+    folder: str,
+    expected_sizes: Optional[Dict[str, int]] = None,
+    max_workers: int = 8,
+    retries: int = 3,
+    backoff: float = 1.0,
+) -> Dict[str, str]:
+    """Downloads the files concurrently with a bounded thread pool
+
+    All the files are tried before an error is raised, so the complete ones stay on disk and are
+    skipped the next time.
+
+    Args:
+        links (List[str]): urls of the files
+        folder (str): destination folder
+        expected_sizes (Optional[Dict[str, int]], optional): size in bytes for each link, from the listing. Defaults to None.
+        max_workers (int, optional): maximum number of parallel downloads. Defaults to 8.
+        retries (int, optional): number of retries for each file. Defaults to 3.
+        backoff (float, optional): seconds to wait before the first retry. Defaults to 1.0.
+
+    Raises:
+        IOError: if some files could not be downloaded after all the retries, with the failed links
+
+    Returns:
+        Dict[str, str]: the local path for every link
+    """
+    if expected_sizes is None:
+        expected_sizes = {}
+    os.makedirs(folder, exist_ok=True)
+    paths = {}
+    failures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            link: executor.submit(
+                download_file,
+                link,
+                folder,
+                expected_sizes.get(link),
+                retries,
+                backoff,
+            )
+            for link in links
+        }
+        for link, future in futures.items():
+            try:
+                paths[link] = future.result()
+            except IOError as e:
+                logger.error("%s (%s)", e, e.__cause__)
+                failures.append(link)
+    if failures:
+        raise IOError(f"Not able to download {len(failures)} file(s): {failures}")
+    return paths
+
+
+def _filename(link: str) -> str:
+    return str.split(link, "/")[-1]
+
+
+def _station_id(link: str) -> str:
+    return re.findall("_\d{5}_", _filename(link))[0][1:-1]
+
+
+def read_archive(
+    file_zip: str,
+    time: str,
+    columns: Optional[List[str]] = None,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    chunksize: int = 100000,
+) -> pd.DataFrame:
+    """Reads the data files of a DWD archive (the metadata files are skipped)
+
+    The files are read in chunks and the rows outside of the years are dropped from every chunk,
+    so the memory needed is one chunk plus the rows that are kept.
+
+    Args:
+        file_zip (str): path of the zip file
+        time (str): "10_minutes", "hourly" or "daily"
+        columns (Optional[List[str]], optional): measured columns to read (e.g. ["TT_TU"]). Defaults to None (all columns).
+        start_year (Optional[int], optional): first year to keep. Defaults to None.
+        end_year (Optional[int], optional): last year to keep. Defaults to None.
+        chunksize (int, optional): number of rows read at once. Defaults to 100000.
+
+    Returns:
+        pd.DataFrame: the data of the station in the compact schema, with the time columns
+    """
+    low, high = date_bounds(time, start_year, end_year)
+    frames = []
+    with ZipFile(file_zip) as myzip:
+        for filename in myzip.namelist():
+            if "Metadat" not in filename:
+                with myzip.open(filename) as myfile:
+                    for chunk in iter_product(myfile, columns, chunksize):
+                        in_range = (chunk["MESS_DATUM"] >= low) & (
+                            chunk["MESS_DATUM"] < high
+                        )
+                        frames.append(chunk[in_range])
+    df = pd.concat(frames, ignore_index=True)
+    df = station_categories(df)
+    df = add_time_columns(df, time)
+    return df
+
+
+def stream_archives(
+    files: List[str],
+    time: str,
+    columns: Optional[List[str]] = None,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    chunksize: int = 100000,
+) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """Reads the archives one by one, yielding the data of one station at a time
+
+    The archives that cannot be read are logged and skipped.
+
+    Args:
+        files (List[str]): paths of the zip files
+        time (str): "10_minutes", "hourly" or "daily"
+        columns (Optional[List[str]], optional): measured columns to read. Defaults to None (all columns).
+        start_year (Optional[int], optional): first year to keep. Defaults to None.
+        end_year (Optional[int], optional): last year to keep. Defaults to None.
+        chunksize (int, optional): number of rows read at once. Defaults to 100000.
+
+    Yields:
+        Iterator[Tuple[str, pd.DataFrame]]: the path of each archive and its data in the requested years
+    """
+    for file_zip in files:
+        try:
+            df = read_archive(file_zip, time, columns, start_year, end_year, chunksize)
+        except Exception as e:
+            logger.warning("Not able to open %s: %s", file_zip, e)
+            continue
+        if len(df) > 0:
+            yield file_zip, df
 
 
 def download_dwd_data(
@@ -17,20 +248,29 @@ def download_dwd_data(
     time: str,
     start_year: int,
     end_year: int,
-    dwd_links: dict,
+    dwd_links: Union[dict, pd.DataFrame],
     ids: Optional[str] = None,
     is_test=True,
+    max_workers: int = 8,
+    columns: Optional[List[str]] = None,
 ) -> pd.DataFrame:
     """ Downloads the requested data, selects the needed
 
+    Every archive is read only once, in chunks and one station at a time (see stream_archives),
+    and written whole to the columnar store (see station_store). The stations, years and columns
+    are then loaded from there, so later calls with other years or columns download nothing.
+
     Args:
         parameter (str): "air_temperature","dew_point", "moisture" or "precipitation"
         time (str): "10_minutes", "hourly" or "daily"
         start_year (int): beginning of the time period for the data
         end_year (int): end of the time period from the data
-        dwd_links (dict): the links generated with another funtions
+        dwd_links (dict): the links generated with another funtions, or the index from dwd_index.load_index
         ids (Optional[str], optional): ID's of the weather stations you want data on. Defaults to None.
         is_test (bool, optional): For testing it only takes the first 5 stations if this value is true. Defaults to True.
+        max_workers (int, optional): number of files downloaded in parallel. Defaults to 8.
+        columns (Optional[List[str]], optional): measured columns to load (e.g. ["TT_TU"]), the station
+            and time columns are always loaded. Defaults to None (all columns).
 
     Raises:
         ValueError: Raises error if one of the mentioned ID's is not found
@@ -43,39 +283,47 @@ def download_dwd_data(
         limit = 4
     else:
         limit = 99999
-    df = pd.DataFrame()
-    for link in dwd_links[time][parameter]:
+    # Step 1: select the links we need
+    links = []
+    sizes = {}
+    for row in index_frame(dwd_links, time, parameter).itertuples():
         if test_count <= limit:
             test_count += 1
-            filename = str.split(link, "/")[-1]
             # Check if the file is in the time range
-            if start_year < get_date(filename)[0] or end_year > get_date(filename)[1]:
+            if start_year < row.start_year or end_year > row.end_year:
                 continue
             # Check if the id is in the ID list
             if ids != None:
-                id = re.findall("_\d{5}_", str(filename))[0][1:-1]
-                if id not in ids:
+                if row.station_id not in ids:
                     continue
-            if not exists("downloads/" + time + "/" + parameter + "/" + filename):
-                file_zip = wget.download(
-                    link, "downloads/" + time + "/" + parameter + "/"
-                )
-                print("downloading" + filename + "...", end=" ", flush=True)
-            else:
-                file_zip = "downloads/" + time + "/" + parameter + "/" + filename
-                # print("FOUND "+ filename, end =" ", flush=True)
-            try:
-                with ZipFile(file_zip) as myzip:
-                    for filename in myzip.namelist():
-                        if "Metadat" not in filename:
-                            with myzip.open(filename) as myfile:
-                                this_df = pd.read_csv(myfile, sep=";")
-                                this_df["STATIONS_ID"] = this_df["STATIONS_ID"].apply(
-                                    lambda x: str(x).zfill(5)
-                                )
-                                df = pd.concat([df, this_df])
-            except:
-                print("Not able to open:", filename, "Reason: unknown.")
+            links.append(row.link)
+            if not pd.isna(row.size):
+                sizes[row.link] = int(row.size)
+    # Step 2: download and store the archives that are not in the store yet
+    to_store = [
+        link
+        for link in links
+        if stored_source(time, parameter, _station_id(link)) != _filename(link)
+    ]
+    paths = download_files(
+        to_store,
+        "downloads/" + time + "/" + parameter + "/",
+        expected_sizes=sizes,
+        max_workers=max_workers,
+    )
+    for path, this_df in stream_archives(list(paths.values()), time):
+        write_station(this_df, time, parameter, source=os.path.basename(path))
+    # Step 3: load just the stations, years and columns requested from the store
+    if columns is not None:
+        columns = ["STATIONS_ID", "MESS_DATUM"] + time_columns(time) + list(columns)
+    df = load_store(
+        time,
+        parameter,
+        stations=[_station_id(link) for link in links],
+        start_year=start_year,
+        end_year=end_year,
+        columns=columns,
+    )
     # Checking if all given ids were found in the data
     if ids != None:
         if len(list(set(ids) - set(df["STATIONS_ID"].unique()))) == 0:
@@ -84,16 +332,6 @@ def download_dwd_data(
             raise ValueError(
                 "Not found for id(s):", list(set(ids) - set(df["STATIONS_ID"].unique()))
             )
-    if time == "hourly":
-        df["year"] = df["MESS_DATUM"].apply(lambda x: str(x)[:4]).astype(int)
-        df["month"] = df["MESS_DATUM"].apply(lambda x: str(x)[4:6]).astype(int)
-        df["day"] = df["MESS_DATUM"].apply(lambda x: str(x)[6:8]).astype(int)
-        df["hour"] = df["MESS_DATUM"].apply(lambda x: str(x)[8:10]).astype(int)
-    # Cleaning the white spaces from column names
-    df.columns = [col.strip() for col in df.columns]
-    # Returning just the years requested
-    df = df[df["year"] >= start_year]
-    df = df[df["year"] <= end_year]
     return df
 
 
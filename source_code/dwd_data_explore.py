@@ -1,15 +1,21 @@
-import re
-import requests
 import pandas as pd
 import seaborn as sns
 import geopandas as gpd
 import matplotlib.pyplot as plt
-from typing import List, Tuple
-from functools import lru_cache
-from requests_html import HTMLSession
+from typing import List, Tuple, Union
+
+from source_code.dwd_index import (
+    INDEX_PATH,
+    coverage_matrix,
+    covering_stations,
+    index_frame,
+    links_from_index,
+    load_index,
+    station_coverage,
+    update_index,
+)
 
 
-@lru_cache  # caching the return of the function for time optimisation; not sure if this function is supported in jupyter notebook
 def get_links(
     parameters: Tuple[str] = (
         "air_temperature",
@@ -17,45 +23,45 @@ def get_links(
         "moisture",
         "precipitation",
     ),  # type: ignore
-    time: List[str] = ["1_minute", "5_minutes", "10_minutes", "hourly"],
+    time: Tuple[str] = ("1_minute", "5_minutes", "10_minutes", "hourly"),  # type: ignore
+    offline: bool = False,
+    index_path: str = INDEX_PATH,
 ) -> dict:
     """Return the links from dwd corresponding to the parameters and timeframe we are interested
 
+    The links are kept in an index on disk (see dwd_index), only the listings that changed are downloaded again.
+
     Args:
         parameters (tuple[str]): a tuple with the parameters
-        time (List[str], optional): the timeframe. Defaults to ["1_minute","5_minutes","10_minutes","hourly"].
+        time (Tuple[str], optional): the timeframe. Defaults to ("1_minute","5_minutes","10_minutes","hourly").
+        offline (bool, optional): if true, the saved index is used without going online. Defaults to False.
+        index_path (str, optional): the csv of the index. Defaults to INDEX_PATH.
 
     Returns:
         dict: a dictionary containing the links
     """
-
+    if offline:
+        index = load_index(index_path)
+    else:
+        index = update_index(parameters, time, path=index_path)
+    index = index[index["interval"].isin(time) & index["parameter"].isin(parameters)]
     dwd_links = {interval: {key: None for key in parameters} for interval in time}
-    for interval in time:
-        for parameter in parameters:
-            url = (
-                "https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/"
-                + str(interval)
-                + "/"
-                + parameter
-                + "/historical/"
-            )
-            try:
-                session = HTMLSession()
-                response = session.get(url)
-                dwd_links[interval][parameter] = response.html.absolute_links
-
-            except requests.exceptions.RequestException as e:
-                print(e)
+    for interval, links in links_from_index(index).items():
+        dwd_links[interval].update(links)
     return dwd_links
 
 
 def count_datapoints(
-    dwd_links: dict, time, parameter: str, start_year: int, end_year: int
+    dwd_links: Union[dict, pd.DataFrame],
+    time,
+    parameter: str,
+    start_year: int,
+    end_year: int,
 ) -> int:
     """Counting the datapoints for a certain parameter
 
     Args:
-        dwd_links (dict): source of data (dwd)
+        dwd_links (Union[dict, pd.DataFrame]): source of data (dwd), the links or the index from load_index
         time (_type_): time period (10_minutes, hourly)
         parameter (str): climatic parameters we are interested in
         start_year (int): start of the observation period
@@ -64,41 +70,32 @@ def count_datapoints(
     Returns:
         int: numbers of datapoints of the parameter that contain the complete period we are interested
     """
-    i = 0
-    for link in dwd_links[time][parameter]:
-        try:
-            # Getting the date from the links
-            interval = re.findall("\d{8}", link)
-            start_interval = int(interval[0][:4])
-            end_interval = int(interval[1][:4])
-            # Counting the links that match the requested interval
-            if (start_interval <= start_year) & (end_interval >= end_year):
-                i = i + 1
-        except:
-            pass
-    return i
-
-
-def show_available_data(dwd_links: dict, time, parameters: Tuple[str]):
-    data_balance = pd.DataFrame(
-        columns=parameters,  # type: ignore
-        index=[str(i) + "'s - present" for i in range(1950, 2020, 10)],
-    )
-    for parameter in parameters:
-        for i in range(1950, 2020, 10):
-            data_balance[parameter][str(i) + "'s - present"] = count_datapoints(
-                dwd_links, time, parameter, i, 2020
-            )
+    df = index_frame(dwd_links, time, parameter)
+    # Counting the archives whose own period contains the requested interval
+    return int(((df["start_year"] <= start_year) & (df["end_year"] >= end_year)).sum())
+
+
+def show_available_data(
+    dwd_links: Union[dict, pd.DataFrame], time, parameters: Tuple[str]
+):
+    coverage = station_coverage(dwd_links, time, parameters)
+    data_balance = coverage_matrix(coverage, parameters, range(1950, 2020, 10), 2020)
+    data_balance = data_balance[list(parameters)]
+    data_balance.index = [str(i) + "'s - present" for i in data_balance.index]
     return data_balance
 
 
 def ids_datapoints(
-    dwd_links: dict, time: str, parameter: str, start_year: int, end_year: int
+    dwd_links: Union[dict, pd.DataFrame],
+    time: str,
+    parameter: str,
+    start_year: int,
+    end_year: int,
 ) -> List[str]:
     """Returns the ids of the weather station that has entries for the parameter in the mentioned timeframe
 
     Args:
-        dwd_links (dict): source of data (dwd)
+        dwd_links (Union[dict, pd.DataFrame]): source of data (dwd), the links or the index from load_index
         time (str): time period (10_minutes, hourly)
         parameter (str): climatic parameters we are interested in
         start_year (int): start of the observation period
@@ -107,21 +104,8 @@ def ids_datapoints(
     Returns:
         List[str]: ids of weather stations that have the parameter that contain the complete period we are interested
     """
-    list = []
-    for link in dwd_links[time][parameter]:
-        try:
-            # Get the date from the links
-            interval = re.findall("\d{8}", link)
-            start_interval = int(interval[0][:4])
-            end_interval = int(interval[1][:4])
-
-            # Get the id from the link
-            if (start_interval <= start_year) & (end_interval >= end_year):
-                id = re.findall("_\d{5}_", str(link))[0]
-                list.append(id[1:-1])
-        except:
-            pass
-    return list
+    coverage = station_coverage(dwd_links, time, [parameter])
+    return covering_stations(coverage, [parameter], start_year, end_year)
 
 
 def common_stations(ids_parameter1: List[int], ids_parameter2: List[int]) -> List:
@@ -166,20 +150,10 @@ def plot_points_germany(dwd_links):
     countries = gpd.read_file(gpd.datasets.get_path("naturalearth_lowres"))
     countries[countries["name"] == "Germany"].plot(color="lightgrey", ax=ax)
     # Plotting for each time range
+    parameters = ["moisture", "dew_point", "air_temperature"]
+    coverage = station_coverage(dwd_links, "hourly", parameters)
     for start_year in range(1970, 1949, -10):
-        moisture_year_h = ids_datapoints(
-            dwd_links, "hourly", "moisture", start_year, 2020
-        )
-        dew_point_year_h = ids_datapoints(
-            dwd_links, "hourly", "dew_point", start_year, 2020
-        )
-        air_temp_year_h = ids_datapoints(
-            dwd_links, "hourly", "air_temperature", start_year, 2020
-        )
-
-        common_ids = common_stations(
-            common_stations(moisture_year_h, dew_point_year_h), air_temp_year_h  # type: ignore
-        )
+        common_ids = covering_stations(coverage, parameters, start_year, 2020)
         stations_coordinates = coordinates_stations(
             common_ids,
             "downloads/hourly/dew_point/TD_Stundenwerte_Beschreibung_Stationen.txt",
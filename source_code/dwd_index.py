@@ -0,0 +1,317 @@
+import os
+import re
+import json
+import requests
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+
+DWD_URL = (
+    "https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/"
+)
+INDEX_PATH = "downloads/dwd_index.csv"
+INDEX_COLUMNS = [
+    "interval",
+    "parameter",
+    "filename",
+    "link",
+    "station_id",
+    "start_date",
+    "end_date",
+    "size",
+    "last_modified",
+]
+
+# One line of the listing: <a href="file">file</a>   24-Mar-2023 10:13   1469291
+LISTING_ROW = re.compile(
+    r'<a href="([^"?/]+)">[^<]*</a>\s+(\d{2}-\w{3}-\d{4} \d{2}:\d{2})\s+(\d+|-)'
+)
+# The station id and the period in the name of the archives
+FILE_PATTERN = r"_(\d{5})_(\d{8})_(\d{8})_"
+
+
+def listing_url(interval: str, parameter: str) -> str:
+    """Returns the url of the historical data of a parameter"""
+    return DWD_URL + str(interval) + "/" + parameter + "/historical/"
+
+
+def parse_listing(html: str, interval: str, parameter: str) -> pd.DataFrame:
+    """Reads the files from a DWD directory listing
+
+    Args:
+        html (str): the html of the listing
+        interval (str): the timeframe (e.g. "hourly")
+        parameter (str): the parameter (e.g. "air_temperature")
+
+    Returns:
+        pd.DataFrame: one row per file with the columns of INDEX_COLUMNS
+    """
+    rows = LISTING_ROW.findall(html)
+    df = pd.DataFrame(rows, columns=["filename", "last_modified", "size"])
+    df["interval"] = interval
+    df["parameter"] = parameter
+    df["link"] = listing_url(interval, parameter) + df["filename"]
+    df[["station_id", "start_date", "end_date"]] = df["filename"].str.extract(
+        FILE_PATTERN
+    )
+    df["size"] = pd.to_numeric(df["size"], errors="coerce")
+    df["last_modified"] = pd.to_datetime(df["last_modified"], format="%d-%b-%Y %H:%M")
+    return df[INDEX_COLUMNS]
+
+
+def fetch_listing(
+    interval: str, parameter: str, headers: Optional[dict] = None, timeout: float = 60
+) -> Tuple[Optional[pd.DataFrame], dict]:
+    """Downloads a listing, only if it changed since the last time
+
+    Args:
+        interval (str): the timeframe (e.g. "hourly")
+        parameter (str): the parameter (e.g. "air_temperature")
+        headers (Optional[dict], optional): the ETag and Last-Modified headers of the last download. Defaults to None.
+        timeout (float, optional): timeout in seconds. Defaults to 60.
+
+    Returns:
+        Tuple[Optional[pd.DataFrame], dict]: the files (None if the listing did not change) and the new headers
+    """
+    if headers is None:
+        headers = {}
+    request_headers = {}
+    if "ETag" in headers:
+        request_headers["If-None-Match"] = headers["ETag"]
+    if "Last-Modified" in headers:
+        request_headers["If-Modified-Since"] = headers["Last-Modified"]
+    response = requests.get(
+        listing_url(interval, parameter), headers=request_headers, timeout=timeout
+    )
+    if response.status_code == 304:
+        return None, headers
+    response.raise_for_status()
+    new_headers = {
+        key: response.headers[key]
+        for key in ["ETag", "Last-Modified"]
+        if key in response.headers
+    }
+    return parse_listing(response.text, interval, parameter), new_headers
+
+
+def load_index(path: str = INDEX_PATH) -> pd.DataFrame:
+    """Loads the saved index, without going online
+
+    Args:
+        path (str, optional): the csv of the index. Defaults to INDEX_PATH.
+
+    Returns:
+        pd.DataFrame: the index (empty if it was never saved)
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+    return pd.read_csv(
+        path,
+        dtype={"station_id": str, "start_date": str, "end_date": str},
+        parse_dates=["last_modified"],
+    )
+
+
+def update_index(
+    parameters: Iterable[str],
+    time: Iterable[str],
+    path: str = INDEX_PATH,
+    max_workers: int = 8,
+) -> pd.DataFrame:
+    """Refreshes the saved index from DWD, downloading only the listings that changed
+
+    Args:
+        parameters (Iterable[str]): the parameters (e.g. ("air_temperature", "moisture"))
+        time (Iterable[str]): the timeframes (e.g. ("hourly",))
+        path (str, optional): the csv of the index. Defaults to INDEX_PATH.
+        max_workers (int, optional): number of listings downloaded in parallel. Defaults to 8.
+
+    Returns:
+        pd.DataFrame: the updated index
+    """
+    index = load_index(path)
+    headers_path = os.path.splitext(path)[0] + "_headers.json"
+    headers = {}
+    if os.path.exists(headers_path):
+        with open(headers_path) as myfile:
+            headers = json.load(myfile)
+    pairs = [(interval, parameter) for interval in time for parameter in parameters]
+    # a listing missing from the index is downloaded again, whatever the headers say
+    indexed = set(zip(index["interval"], index["parameter"]))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            pair: executor.submit(
+                fetch_listing,
+                pair[0],
+                pair[1],
+                headers.get("/".join(pair)) if pair in indexed else None,
+            )
+            for pair in pairs
+        }
+        for (interval, parameter), future in futures.items():
+            try:
+                listing, headers["/".join([interval, parameter])] = future.result()
+            except requests.exceptions.RequestException as e:
+                print(e)
+                continue
+            if listing is None:
+                continue
+            index = index[
+                ~((index["interval"] == interval) & (index["parameter"] == parameter))
+            ]
+            index = pd.concat([index, listing], ignore_index=True)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    index.to_csv(path, index=False)
+    with open(headers_path, "w") as myfile:
+        json.dump(headers, myfile, indent=2)
+    return index
+
+
+def links_from_index(index: pd.DataFrame) -> Dict[str, Dict[str, set]]:
+    """Returns the links of the index in the format of get_links: {interval: {parameter: links}}"""
+    dwd_links = {}
+    for (interval, parameter), group in index.groupby(["interval", "parameter"]):
+        dwd_links.setdefault(interval, {})[parameter] = set(group["link"])
+    return dwd_links
+
+
+def index_frame(
+    dwd_links: Union[dict, pd.DataFrame], time: str, parameter: str
+) -> pd.DataFrame:
+    """Returns the archives of a parameter with their station id and years
+
+    Args:
+        dwd_links (Union[dict, pd.DataFrame]): the links from get_links or the index from load_index
+        time (str): the timeframe (e.g. "hourly")
+        parameter (str): the parameter (e.g. "air_temperature")
+
+    Returns:
+        pd.DataFrame: one row per archive with the link, station_id, start_year, end_year and size columns
+    """
+    if isinstance(dwd_links, pd.DataFrame):
+        df = dwd_links[
+            (dwd_links["interval"] == time) & (dwd_links["parameter"] == parameter)
+        ]
+        df = df[["link", "station_id", "start_date", "end_date", "size"]]
+    else:
+        links = dwd_links[time][parameter]
+        df = pd.DataFrame({"link": list(links) if links is not None else []})
+        df[["station_id", "start_date", "end_date"]] = df["link"].str.extract(
+            FILE_PATTERN
+        )
+        df["size"] = float("nan")
+    df = df.dropna(subset=["station_id"]).copy()
+    df["start_year"] = df["start_date"].str[:4].astype(int)
+    df["end_year"] = df["end_date"].str[:4].astype(int)
+    return df.reset_index(drop=True)
+
+
+def station_coverage(
+    dwd_links: Union[dict, pd.DataFrame], time: str, parameters: Iterable[str]
+) -> pd.DataFrame:
+    """Returns the periods covered by every station for every parameter
+
+    The archives of a station that overlap or follow each other without a missing day are merged
+    into one period, so a gap between two archives splits the coverage in two periods.
+
+    Args:
+        dwd_links (Union[dict, pd.DataFrame]): the links from get_links or the index from load_index
+        time (str): the timeframe (e.g. "hourly")
+        parameters (Iterable[str]): the parameters (e.g. ("air_temperature", "moisture"))
+
+    Returns:
+        pd.DataFrame: one row per period with the station_id, parameter, start and end (years) columns
+    """
+    periods = []
+    for parameter in parameters:
+        df = index_frame(dwd_links, time, parameter)
+        start = pd.to_datetime(df["start_date"], format="%Y%m%d")
+        end = pd.to_datetime(df["end_date"], format="%Y%m%d")
+        df = pd.DataFrame({"station_id": df["station_id"], "start": start, "end": end})
+        df = df.sort_values(["station_id", "start"], kind="stable")
+        # Step 1: a new period starts after a missing day, or with a new station
+        reached = df.groupby("station_id")["end"].cummax()
+        previous = reached.groupby(df["station_id"]).shift()
+        new_period = previous.isna() | (df["start"] > previous + pd.Timedelta(days=1))
+        # Step 2: the first and last year of every period
+        merged = df.groupby(new_period.cumsum()).agg(
+            station_id=("station_id", "first"),
+            start=("start", "min"),
+            end=("end", "max"),
+        )
+        periods.append(
+            pd.DataFrame(
+                {
+                    "station_id": merged["station_id"].to_numpy(),
+                    "parameter": parameter,
+                    "start": merged["start"].dt.year.to_numpy(),
+                    "end": merged["end"].dt.year.to_numpy(),
+                }
+            )
+        )
+    coverage = pd.concat(periods, ignore_index=True)
+    return coverage.astype({"start": int, "end": int})
+
+
+def _covered(
+    coverage: pd.DataFrame,
+    parameters: List[str],
+    start_years: np.ndarray,
+    end_year: int,
+) -> Tuple[pd.Index, np.ndarray]:
+    # stations x parameters x start years: a period of the station covers start year - end_year
+    coverage = coverage[coverage["parameter"].isin(parameters)]
+    station, stations = pd.factorize(coverage["station_id"], sort=True)
+    parameter = pd.Index(parameters).get_indexer(coverage["parameter"])
+    covered = (coverage["start"].to_numpy()[:, None] <= start_years[None, :]) & (
+        coverage["end"].to_numpy() >= end_year
+    )[:, None]
+    table = np.zeros((len(stations), len(parameters), len(start_years)), dtype=bool)
+    np.logical_or.at(table, (station, parameter), covered)
+    return pd.Index(stations), table
+
+
+def covering_stations(
+    coverage: pd.DataFrame, parameters: Iterable[str], start_year: int, end_year: int
+) -> List[str]:
+    """Returns the stations that have all the parameters for the complete period
+
+    Args:
+        coverage (pd.DataFrame): the coverage from station_coverage
+        parameters (Iterable[str]): the parameters that must all be measured
+        start_year (int): start of the observation period
+        end_year (int): end of the observation period
+
+    Returns:
+        List[str]: the ids of the stations, a station covers the period when one of its periods contains it
+    """
+    stations, table = _covered(
+        coverage, list(parameters), np.array([start_year]), end_year
+    )
+    return list(stations[table[:, :, 0].all(axis=1)])
+
+
+def coverage_matrix(
+    coverage: pd.DataFrame,
+    parameters: Iterable[str],
+    start_years: Iterable[int],
+    end_year: int,
+) -> pd.DataFrame:
+    """Counts the stations covering every start year until end_year, for every parameter and for all of them together
+
+    Args:
+        coverage (pd.DataFrame): the coverage from station_coverage
+        parameters (Iterable[str]): the parameters
+        start_years (Iterable[int]): the start years (e.g. range(1950, 2020, 10))
+        end_year (int): end of the observation period
+
+    Returns:
+        pd.DataFrame: the number of stations, one row per start year, one column per parameter and the "all" column
+    """
+    parameters = list(parameters)
+    start_years = np.asarray(list(start_years))
+    _, table = _covered(coverage, parameters, start_years, end_year)
+    counts = pd.DataFrame(table.sum(axis=0).T, index=start_years, columns=parameters)
+    counts["all"] = table.all(axis=1).sum(axis=0)
+    return counts
@@ -0,0 +1,145 @@
+import pandas as pd
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+# Value used by DWD for missing measurements
+MISSING_VALUE = -999
+
+# Measured columns of the DWD product files, by parameter
+MEASUREMENTS: Dict[str, List[str]] = {
+    "air_temperature": ["TT_TU", "RF_TU"],  # produkt_tu_stunde
+    "dew_point": ["TT", "TD"],  # produkt_td_stunde
+    "moisture": [
+        "ABSF_STD",
+        "VP_STD",
+        "TF_STD",
+        "P_STD",
+        "TT_STD",
+        "RF_STD",
+        "TD_STD",
+    ],  # produkt_tf_stunde
+    "precipitation": ["R1", "RS_IND", "WRTR"],  # produkt_rr_stunde
+    "sun": ["SD_SO"],  # produkt_sd_stunde
+    "wind": ["F", "D"],  # produkt_ff_stunde
+}
+
+# Number of digits of MESS_DATUM after the date (YYYYMMDD), by time resolution
+TIME_DIGITS = {"daily": 0, "hourly": 2, "10_minutes": 4, "5_minutes": 4, "1_minute": 4}
+
+TIME_DTYPES = {
+    "year": "int16",
+    "month": "int8",
+    "day": "int8",
+    "month_day": "int16",
+    "hour": "int8",
+}
+
+
+def time_columns(time: str = "hourly") -> List[str]:
+    """Returns the columns added by add_time_columns for the time resolution"""
+    columns = ["year", "month", "day", "month_day"]
+    if TIME_DIGITS[time] > 0:
+        columns.append("hour")
+    return columns
+
+
+def _usecols(columns: Optional[List[str]]):
+    if columns is None:
+        return lambda col: col.strip() != "eor"
+    keep = set(["STATIONS_ID", "MESS_DATUM"] + list(columns))
+    return lambda col: col.strip() in keep
+
+
+def read_product(
+    myfile: Union[str, IO], columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Reads a DWD product file ("produkt_*.txt") with compact dtypes
+
+    STATIONS_ID and MESS_DATUM are read as integers, every other column as float32,
+    the "eor" column is dropped and the missing value (-999) is replaced with NaN.
+
+    Args:
+        myfile (Union[str, IO]): path or open file of the product
+        columns (Optional[List[str]], optional): measured columns to keep. Defaults to None (all columns).
+
+    Returns:
+        pd.DataFrame: the data of the file
+    """
+    df = pd.read_csv(myfile, sep=";", skipinitialspace=True, usecols=_usecols(columns))
+    return to_schema(df)
+
+
+def iter_product(
+    myfile: Union[str, IO], columns: Optional[List[str]] = None, chunksize: int = 100000
+) -> Iterator[pd.DataFrame]:
+    """Reads a DWD product file in chunks, like read_product
+
+    Args:
+        myfile (Union[str, IO]): path or open file of the product
+        columns (Optional[List[str]], optional): measured columns to keep. Defaults to None (all columns).
+        chunksize (int, optional): number of rows in a chunk. Defaults to 100000.
+
+    Yields:
+        Iterator[pd.DataFrame]: the chunks of the file
+    """
+    with pd.read_csv(
+        myfile,
+        sep=";",
+        skipinitialspace=True,
+        usecols=_usecols(columns),
+        chunksize=chunksize,
+    ) as reader:
+        for chunk in reader:
+            yield to_schema(chunk)
+
+
+def date_bounds(
+    time: str, start_year: Optional[int] = None, end_year: Optional[int] = None
+) -> Tuple[int, int]:
+    """Returns the MESS_DATUM interval [low, high) covering the years start_year - end_year"""
+    scale = 10 ** (4 + TIME_DIGITS[time])
+    low = start_year * scale if start_year is not None else 0
+    high = (end_year + 1) * scale if end_year is not None else 10**18
+    return low, high
+
+
+def to_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Strips the column names and converts the columns to the compact dtypes"""
+    df.columns = [col.strip() for col in df.columns]
+    for col in df.columns:
+        if col in ["STATIONS_ID", "MESS_DATUM"]:
+            df[col] = df[col].astype("int64")
+        elif df[col].dtype != "float32":
+            values = pd.to_numeric(df[col], errors="coerce").astype("float32")
+            df[col] = values.mask(values == MISSING_VALUE)
+    return df
+
+
+def station_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Replaces the numeric STATIONS_ID with a categorical of the 5 digit ids (e.g. 3 -> "00003")"""
+    codes, uniques = pd.factorize(df["STATIONS_ID"])
+    df["STATIONS_ID"] = pd.Categorical.from_codes(
+        codes, [str(i).zfill(5) for i in uniques]
+    )
+    return df
+
+
+def add_time_columns(df: pd.DataFrame, time: str = "hourly") -> pd.DataFrame:
+    """Adds the year, month, day, month_day (and hour) columns computed from MESS_DATUM
+
+    Args:
+        df (pd.DataFrame): data with the MESS_DATUM column (YYYYMMDD[HH[MM]])
+        time (str, optional): "10_minutes", "hourly" or "daily". Defaults to "hourly".
+
+    Returns:
+        pd.DataFrame: the data with the time columns
+    """
+    date = df["MESS_DATUM"].to_numpy(dtype="int64") // 10 ** TIME_DIGITS[time]
+    df["year"] = (date // 10000).astype(TIME_DTYPES["year"])
+    df["month"] = (date // 100 % 100).astype(TIME_DTYPES["month"])
+    df["day"] = (date % 100).astype(TIME_DTYPES["day"])
+    # month * 100 + day, for selecting the windows of the year (see general_functions.season_mask)
+    df["month_day"] = (date % 10000).astype(TIME_DTYPES["month_day"])
+    if TIME_DIGITS[time] > 0:
+        hour = df["MESS_DATUM"].to_numpy(dtype="int64") // 10 ** (TIME_DIGITS[time] - 2)
+        df["hour"] = (hour % 100).astype(TIME_DTYPES["hour"])
+    return df
@@ -1,44 +1,31 @@
-from cmath import sqrt
-import seaborn as sns
+import numpy as np
 import pandas as pd
-from typing import List, Optional
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
 import matplotlib.transforms as mtransforms
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 
 from source_code.general_functions import select_time_range
-
-CONV_FACT = 96191163.12099737
-
-
-def equation_fusarium(t: float):
-    tmin = 5
-    tmax = 30
-    if t <= tmin:
-        return 0
-    if t >= tmax:
-        return 0
-    b, c = 17.2, 10.5
-    teq = (t - tmin) / (tmax - tmin)
-    y = (teq**b) * ((1 - teq) ** c) * CONV_FACT
-
-    return y
-
-
-def equation_fusarium_t_2(t: float):
-    return 1
-
-
-def equation_fusarium_rh(rh: float) -> float:
-
-    if rh > 100:
-        rh = 100
-    c = 0.850
-    y = c ** (100 - rh)
-    return y * 1
-
-
-def plot_risk_fusarium(
+from source_code.plot_functions import new_figure
+from source_code.disease_models import (
+    CONV_FACT,
+    apply_model,
+    combined_risk,
+    equation_fusarium,
+    equation_fusarium_rh,
+    equation_fusarium_t_2,
+)
+
+# The historic levels drawn as horizontal lines: key of the data, name and color
+HISTORIC_LEVELS = [
+    ("avg_hist", "average", "green"),
+    ("min_hist", "minimum", "black"),
+    ("max_hist", "maximum", "red"),
+]
+
+
+def risk_fusarium_data(
     df_airtemp: pd.DataFrame,
     df_moisture,
     hist_start: float,
@@ -46,157 +33,224 @@ def plot_risk_fusarium(
     start_dd_mm: str,
     end_dd_mm: str,
     moving_average: int,
-):
+    windows: Optional[pd.DataFrame] = None,
+) -> Dict:
+    """The yearly temperature and humidity risks drawn by plot_risk_fusarium
+
+    Returns:
+        Dict: the yearly frames ("airtemp", "moisture"), the historic levels and the labels
+    """
 
     # Step 1: create the time intervals from the input "dd.mm"
     df_airtemp = select_time_range(
-        df_airtemp, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm
+        df_airtemp, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
     )
     df_moisture = select_time_range(
-        df_moisture, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm
+        df_moisture, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
     )
     # Step 2: apply the function for the model
 
     # Step 2.1: the model for temperature
-    df_airtemp["useful_t"] = df_airtemp.TT_TU.apply(equation_fusarium)
+    df_airtemp["useful_t"] = apply_model(equation_fusarium, df_airtemp.TT_TU)
 
     # Step 2.2: the model for moisutre
-    df_moisture["rh_risk"] = df_moisture.RF_STD.apply(equation_fusarium_rh)
+    df_moisture["rh_risk"] = apply_model(equation_fusarium_rh, df_moisture.RF_STD)
 
     # Step 3: process and prepare for plotting
     # Step 3.1: for temperature
-    df_airtemp = df_airtemp.groupby(["year"]).mean()
+    df_airtemp = df_airtemp.groupby("year")[["TT_TU", "useful_t"]].mean()
     avg_hist = df_airtemp[
         (df_airtemp.index <= hist_end) & (df_airtemp.index >= hist_start)  # type: ignore
     ]["useful_t"].mean()
-    max_hist = df_airtemp[
-        (df_airtemp.index <= hist_end) & (df_airtemp.index >= hist_start)  # type: ignore
-    ]["useful_t"].max()
-    min_hist = df_airtemp[
-        (df_airtemp.index <= hist_end) & (df_airtemp.index >= hist_start)  # type: ignore
-    ]["useful_t"].min()
     df_airtemp[f"{moving_average}years_average"] = df_airtemp.useful_t.rolling(
         moving_average
     ).mean()
 
     # Step 3.2: for moisture
-    df_moisture = df_moisture.groupby(["year"]).mean()
+    df_moisture = df_moisture.groupby("year")[["RF_STD", "rh_risk"]].mean()
     avg_hist_m = df_moisture[
         (df_moisture.index <= hist_end) & (df_moisture.index >= hist_start)
     ]["rh_risk"].mean()
-    # max_hist = df_airtemp[(df_airtemp.index <= hist_end)&(df_airtemp.index >= hist_start)]["useful_t"].max()
-    # min_hist = df_airtemp[(df_airtemp.index <= hist_end)&(df_airtemp.index >= hist_start)]["useful_t"].min()
     df_moisture[f"{moving_average}years_average"] = df_moisture.rh_risk.rolling(
         7
     ).mean()
-
-    # Step 4: plot
-    # Step 4.1: Make a grid
-    gs = gridspec.GridSpec(10, 10)
-    fig = plt.figure(figsize=(15, 8))
-
-    # Step 4.2: Plot in different spaces of the grid
-    # Step 4.2.1: Left upper corner
+    return {
+        "airtemp": df_airtemp,
+        "moisture": df_moisture,
+        "avg_hist": avg_hist,
+        "avg_hist_m": avg_hist_m,
+        "hist_start": hist_start,
+        "hist_end": hist_end,
+        "moving_average": moving_average,
+    }
+
+
+@lru_cache(maxsize=None)
+def model_response(
+    func: Callable, start: int, stop: int, divisor: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The output of a model over a range of inputs, computed once per model and range
+
+    Args:
+        func (Callable): the model, e.g. equation_fusarium
+        start (int): the first input, times divisor
+        stop (int): the end of the inputs (excluded), times divisor
+        divisor (int, optional): the inputs are np.arange(start, stop) / divisor. Defaults to 1.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the inputs and the outputs, read only
+    """
+    inputs = np.arange(start, stop, 1) / divisor
+    outputs = apply_model(func, inputs)
+    inputs.flags.writeable = False
+    outputs.flags.writeable = False
+    return inputs, outputs
+
+
+def _model_panels(fig, gs) -> Tuple[plt.Axes, plt.Axes]:
+    # the development of the fungus at every temperature and humidity, the same for all the figures
+    # Step 1: Left upper corner
     ax1 = fig.add_subplot(gs[0:2, 0:5])
-    degr = [equation_fusarium(i / 100) for i in range(500, 3000, 1)]
-    sns.lineplot(x=[i / 100 for i in range(500, 3000, 1)], y=degr, ax=ax1)
+    ax1.plot(*model_response(equation_fusarium, 500, 3000, 100))
     ax1.set_xlabel("Temperature ($^\circ$C)")
     ax1.set_ylabel("Development of Fusarium")
 
-    # Step 4.2.2: Right upper corner
+    # Step 2: Right upper corner
     ax2 = fig.add_subplot(gs[0:2, 5:10], sharey=ax1)
-    degr = [equation_fusarium_rh(i) for i in range(65, 101)]
-    sns.lineplot(x=[i for i in range(65, 101)], y=degr, ax=ax2)
+    ax2.plot(*model_response(equation_fusarium_rh, 65, 101))
     ax2.set_xlabel("RH (%)")
     plt.setp(ax2.get_yticklabels(), visible=False)
+    return ax1, ax2
 
-    # Step 4.2.3: Middle center
+
+def _panel_letters(fig, axes: List[plt.Axes]):
+    for ax, label in zip(axes, ["a", "b", "c", "d"]):
+        trans = mtransforms.ScaledTranslation(10 / 72, -5 / 72, fig.dpi_scale_trans)
+        ax.text(
+            0,
+            1,
+            label,
+            transform=ax.transAxes + trans,
+            fontsize="medium",
+            verticalalignment="top",
+            fontfamily="serif",
+            bbox=dict(facecolor="0.7", edgecolor="none", pad=3.0),
+        )
+
+
+def risk_fusarium_figure(headless: bool = False) -> Tuple[plt.Figure, List[plt.Axes]]:
+    """The figure of plot_risk_fusarium without the yearly risks, to be drawn on by draw_risk_fusarium
+
+    Args:
+        headless (bool, optional): a figure drawn by Agg, not managed by pyplot (see new_figure). Defaults to False.
+
+    Returns:
+        Tuple[plt.Figure, List[plt.Axes]]: the figure and its four axes
+    """
+    # Step 1: Make a grid
+    gs = gridspec.GridSpec(10, 10)
+    fig = new_figure((15, 8), headless)
+
+    # Step 2: Plot in different spaces of the grid
+    ax1, ax2 = _model_panels(fig, gs)
     ax3 = fig.add_subplot(gs[3:7, :])
-    sns.lineplot(
-        x="year",
-        y="useful_t",
-        data=df_airtemp,
+    ax4 = fig.add_subplot(gs[7:11, :], sharex=ax3)  # row 1, span all columns
+    ax3.tick_params(labelbottom=False)
+
+    # Step 3: Add suptitles, labels, ticks
+    fig.suptitle(
+        "Evolution of parameters associated with disease development of \n Fusarium graminearum in Maize",
+        fontsize=16,
+    )
+    _panel_letters(fig, [ax1, ax2, ax3, ax4])
+    fig.text(
+        0.1,
+        0.00,
+        "Figure 4. Evolution of environmental factors asociated with development of Perithecia in $\it{Fusarium }$  $\it{graminearum}$ in the time period of 1950 - 2020 in 20 weather stations in Germany. \n (a)(b) $\it{Fusarium }$  $\it{graminearum}$ development at different temperatures and RH, where 1 on y axis correspods to the optimal temperature / humidity. \n (c)(d) Evolution of the disease risk corresponding to the given parameter, calculated yearly as a mean of hourly risk, on the months of June August.",
+    )
+    return fig, [ax1, ax2, ax3, ax4]
+
+
+def draw_risk_fusarium(axes: List[plt.Axes], data: Dict):
+    """Draws the yearly risks of risk_fusarium_data on the axes of risk_fusarium_figure"""
+    ax3, ax4 = axes[2], axes[3]
+    df_airtemp, df_moisture = data["airtemp"], data["moisture"]
+    hist_start, hist_end = data["hist_start"], data["hist_end"]
+    moving_average = data["moving_average"]
+
+    # Step 1: Middle center
+    ax3.plot(
+        df_airtemp.index,
+        df_airtemp["useful_t"],
         label="yearly temperature risk",
-        ax=ax3,
         alpha=0.55,
     )
-    sns.lineplot(
-        x="year",
-        y=f"{moving_average}years_average",
-        ax=ax3,
-        data=df_airtemp,
+    ax3.plot(
+        df_airtemp.index,
+        df_airtemp[f"{moving_average}years_average"],
         label=f"{moving_average} years average",
     )
-    # sns.lineplot(x = df_airtemp.index, y = min_hist,linestyle="dashed",ax=ax3, label=f"minimum in the historical period ({hist_start}-{hist_end})")
-    sns.lineplot(
-        x=df_airtemp.index,
-        y=avg_hist,
+    ax3.axhline(
+        data["avg_hist"],
+        color="green",
         linestyle="dashed",
-        ax=ax3,
         label=f"historic temperature risk ({hist_start}-{hist_end})",
     )
-    # sns.lineplot(x = df_airtemp.index, y = max_hist, linestyle="dashed",ax=ax3, label=f"maximum period in the historical period ({hist_start}-{hist_end})")
-    # plt.ylabel("% of hours with optimal temperature")
-    # plt.plot([hist_end,hist_end], [-0.00,0.05], lw=2, color = "0.65", label = "historical period (left)")
+    ax3.legend()
     ax3.set_xlabel("")
     ax3.set_ylabel("risk from temperature")
 
-    # Step 4.2.4: Bottom center
-    ax4 = fig.add_subplot(gs[7:11, :], sharex=ax3)  # row 1, span all columns
-    ax4.sharex(ax3)
-    sns.lineplot(
-        x="year",
-        y="rh_risk",
-        data=df_moisture,
+    # Step 2: Bottom center
+    ax4.plot(
+        df_moisture.index,
+        df_moisture["rh_risk"],
         label="yearly rh risk",
-        ax=ax4,
         alpha=0.55,
     )
-    sns.lineplot(
-        x="year",
-        y=f"{moving_average}years_average",
-        ax=ax4,
-        data=df_moisture,
+    ax4.plot(
+        df_moisture.index,
+        df_moisture[f"{moving_average}years_average"],
         label=f"{moving_average} years average",
     )
-    sns.lineplot(
-        x=df_moisture.index,
-        y=avg_hist_m,
+    ax4.axhline(
+        data["avg_hist_m"],
+        color="green",
         linestyle="dashed",
-        ax=ax4,
         label=f"historic rh risk ({hist_start}-{hist_end})",
     )
+    ax4.legend()
+    ax4.set_xlabel("year")
     ax4.set_ylabel("risk from RH")
 
-    plt.setp(ax3.get_xticklabels(), visible=False)
 
-    # Step 4.3: Add suptitles, labels, ticks
-    fig.suptitle(
-        "Evolution of parameters associated with disease development of \n Fusarium graminearum in Maize",
-        fontsize=16,
-    )
-    for ax, label in zip([ax1, ax2, ax3, ax4], ["a", "b", "c", "d"]):
-        trans = mtransforms.ScaledTranslation(10 / 72, -5 / 72, fig.dpi_scale_trans)
-        ax.text(
-            0,
-            1,
-            label,
-            transform=ax.transAxes + trans,
-            fontsize="medium",
-            verticalalignment="top",
-            fontfamily="serif",
-            bbox=dict(facecolor="0.7", edgecolor="none", pad=3.0),
-        )
-
-    plt.figtext(
-        0.1,
-        0.00,
-        "Figure 4. Evolution of environmental factors asociated with development of Perithecia in $\it{Fusarium }$  $\it{graminearum}$ in the time period of 1950 - 2020 in 20 weather stations in Germany. \n (a)(b) $\it{Fusarium }$  $\it{graminearum}$ development at different temperatures and RH, where 1 on y axis correspods to the optimal temperature / humidity. \n (c)(d) Evolution of the disease risk corresponding to the given parameter, calculated yearly as a mean of hourly risk, on the months of June August.",
+def plot_risk_fusarium(
+    df_airtemp: pd.DataFrame,
+    df_moisture,
+    hist_start: float,
+    hist_end: float,
+    start_dd_mm: str,
+    end_dd_mm: str,
+    moving_average: int,
+    windows: Optional[pd.DataFrame] = None,
+):
+    # Step 1: the yearly risks
+    data = risk_fusarium_data(
+        df_airtemp,
+        df_moisture,
+        hist_start,
+        hist_end,
+        start_dd_mm,
+        end_dd_mm,
+        moving_average,
+        windows=windows,
     )
+    # Step 2: plot
+    fig, axes = risk_fusarium_figure()
+    draw_risk_fusarium(axes, data)
     plt.show()
 
 
-def plot_combined_risk_fusarium(
+def combined_risk_fusarium_data(
     df_airtemp: pd.DataFrame,
     df_moisture,
     hist_start: float,
@@ -205,14 +259,20 @@ def plot_combined_risk_fusarium(
     end_dd_mm: str,
     moving_average: int,
     transf: Optional[str] = None,
-):
+    windows: Optional[pd.DataFrame] = None,
+) -> Dict:
+    """The yearly combined risk drawn by plot_combined_risk_fusarium
+
+    Returns:
+        Dict: the yearly frame ("results"), the historic levels and the labels
+    """
 
     # Step 1: create the time intervals from the input "dd.mm"
     df_airtemp = select_time_range(
-        df_airtemp, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm
+        df_airtemp, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
     )
     df_moisture = select_time_range(
-        df_moisture, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm
+        df_moisture, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
     )
     # Step 2: apply disease models
     # Step 2.1: merge the dataframes on the needed parameters
@@ -224,130 +284,124 @@ def plot_combined_risk_fusarium(
     )
     df_merged = df_merged[common_cols + ["TT_TU", "RF_STD"]]
     # Step 2.2: the model for temperature
-    df_merged["t_risk"] = df_merged.TT_TU.apply(equation_fusarium)
+    df_merged["t_risk"] = apply_model(equation_fusarium, df_merged.TT_TU)
 
     # Step 2.3: the model for moisutre
-    df_merged["rh_risk"] = df_merged.RF_STD.apply(equation_fusarium_rh)
+    df_merged["rh_risk"] = apply_model(equation_fusarium_rh, df_merged.RF_STD)
 
     # Step 2.4: overall risk (combined)
-    if transf == None:
-        df_merged["combined_risk"] = df_merged.apply(
-            lambda x: (x["rh_risk"] * x["t_risk"]), axis=1
-        )
-    elif transf == "sqrt":
-        df_merged["combined_risk"] = df_merged.apply(
-            lambda x: sqrt(x["rh_risk"] * x["t_risk"]), axis=1
-        )
-    elif transf == "LTRH80":
-        df_merged["combined_risk"] = df_merged.apply(
-            lambda x: x["t_risk"] if x["RF_STD"] > 80 else 0, axis=1
-        )
-    elif transf == "LTRH90":
-        df_merged["combined_risk"] = df_merged.apply(
-            lambda x: x["t_risk"] if x["RF_STD"] > 90 else 0, axis=1
-        )
+    df_merged["combined_risk"] = combined_risk(
+        df_merged.t_risk, df_merged.rh_risk, df_merged.RF_STD, transf
+    )
 
-    # Step 2: apply the function for the model
-    df_results = df_merged.groupby(["year"]).mean()
-    avg_hist = df_results[
-        (df_results.index <= hist_end) & (df_results.index >= hist_start)  # type: ignore
-    ]["combined_risk"].mean()
-    max_hist = df_results[
+    # Step 3: yearly means and historic levels
+    df_results = df_merged.groupby("year")[
+        ["TT_TU", "RF_STD", "t_risk", "rh_risk", "combined_risk"]
+    ].mean()
+    hist = df_results[
         (df_results.index <= hist_end) & (df_results.index >= hist_start)  # type: ignore
-    ]["combined_risk"].max()
-    min_hist = df_results[
-        (df_results.index <= hist_end) & (df_results.index >= hist_start)  # type: ignore
-    ]["combined_risk"].min()
+    ]["combined_risk"]
     df_results[f"{moving_average}years_average"] = df_results.combined_risk.rolling(
         moving_average
     ).mean()
-
-    # Step 4: plot
-    # Step 4.1: Make a grid
+    return {
+        "results": df_results,
+        "avg_hist": hist.mean(),
+        "max_hist": hist.max(),
+        "min_hist": hist.min(),
+        "hist_start": hist_start,
+        "hist_end": hist_end,
+        "moving_average": moving_average,
+    }
+
+
+def combined_risk_fusarium_figure(
+    headless: bool = False,
+) -> Tuple[plt.Figure, List[plt.Axes]]:
+    """The figure of plot_combined_risk_fusarium without the yearly risk, to be drawn on by draw_combined_risk_fusarium
+
+    Args:
+        headless (bool, optional): a figure drawn by Agg, not managed by pyplot (see new_figure). Defaults to False.
+
+    Returns:
+        Tuple[plt.Figure, List[plt.Axes]]: the figure and its three axes
+    """
+    # Step 1: Make a grid
     gs = gridspec.GridSpec(10, 10)
-    fig = plt.figure(figsize=(15, 8))
+    fig = new_figure((15, 8), headless)
 
-    # Step 4.2: Plot in different spaces of the grid
-    # Step 4.2.1: Left upper corner
-    ax1 = fig.add_subplot(gs[0:2, 0:5])
-    degr = [equation_fusarium(i / 100) for i in range(500, 3000, 1)]
-    sns.lineplot(x=[i / 100 for i in range(500, 3000, 1)], y=degr, ax=ax1)
-    ax1.set_xlabel("Temperature ($^\circ$C)")
-    ax1.set_ylabel("Development of Fusarium")
+    # Step 2: Plot in different spaces of the grid
+    ax1, ax2 = _model_panels(fig, gs)
+    ax3 = fig.add_subplot(gs[3:11, :])
 
-    # Step 4.2.2: Right upper corner
-    ax2 = fig.add_subplot(gs[0:2, 5:10], sharey=ax1)
-    degr = [equation_fusarium_rh(i) for i in range(65, 101)]
-    sns.lineplot(x=[i for i in range(65, 101)], y=degr, ax=ax2)
-    ax2.set_xlabel("RH (%)")
-    plt.setp(ax2.get_yticklabels(), visible=False)
+    # Step 3: Add suptitles, labels, ticks
+    fig.suptitle(
+        "Evolution of parameters associated with inoculum development of \n Fusarium graminearum in Maize residues",
+        fontsize=16,
+    )
+    _panel_letters(fig, [ax1, ax2, ax3])
+    fig.text(
+        0.1,
+        0.00,
+        "Figure 4. Evolution of environmental factors asociated with development of Perithecia in $\it{Fusarium }$  $\it{graminearum}$ in the time period of 1950 - 2020 in 20 weather stations in Germany. \n (a)(b) $\it{Fusarium }$  $\it{graminearum}$ development at different temperatures and RH, where 1 on y axis correspods to the optimal temperature / humidity. \n (c) Evolution of the disease risk combined temperature and humidity, calculated yearly as a mean of hourly risk, from maize harvest to wheat bbch75",
+    )
+    return fig, [ax1, ax2, ax3]
 
-    # Step 4.2.3: Middle center
-    ax3 = fig.add_subplot(gs[3:11, :])
-    sns.lineplot(
-        x="year",
-        y="combined_risk",
-        data=df_results,
+
+def draw_combined_risk_fusarium(axes: List[plt.Axes], data: Dict):
+    """Draws the yearly risk of combined_risk_fusarium_data on the axes of combined_risk_fusarium_figure"""
+    ax3 = axes[2]
+    df_results = data["results"]
+    hist_start, hist_end = data["hist_start"], data["hist_end"]
+    moving_average = data["moving_average"]
+
+    ax3.plot(
+        df_results.index,
+        df_results["combined_risk"],
         label="yearly combined risk",
-        ax=ax3,
         alpha=0.55,
     )
-    sns.lineplot(
-        x="year",
-        y=f"{moving_average}years_average",
-        ax=ax3,
-        data=df_results,
+    ax3.plot(
+        df_results.index,
+        df_results[f"{moving_average}years_average"],
         label=f"{moving_average} years average",
     )
-    # sns.lineplot(x = df_airtemp.index, y = min_hist,linestyle="dashed",ax=ax3, label=f"minimum in the historical period ({hist_start}-{hist_end})")
-    sns.lineplot(
-        x=df_results.index,
-        y=avg_hist,
-        linestyle="dashed",
-        ax=ax3,
-        label=f"historic average combined risk ({hist_start}-{hist_end})",
-    )
-
-    sns.lineplot(
-        x=df_results.index,
-        y=min_hist,
-        linestyle="dashed",
-        ax=ax3,
-        label=f"historic minimum combined risk ({hist_start}-{hist_end})",
-    )
-
-    sns.lineplot(
-        x=df_results.index,
-        y=max_hist,
-        linestyle="dashed",
-        ax=ax3,
-        label=f"historic maximum combined risk ({hist_start}-{hist_end})",
-    )
-
+    for level, name, color in HISTORIC_LEVELS:
+        ax3.axhline(
+            data[level],
+            color=color,
+            linestyle="dashed",
+            label=f"historic {name} combined risk ({hist_start}-{hist_end})",
+        )
+    ax3.legend()
     ax3.set_xlabel("")
     ax3.set_ylabel("risk from temperature and humidity")
 
-    # Step 4.3: Add suptitles, labels, ticks
-    fig.suptitle(
-        "Evolution of parameters associated with inoculum development of \n Fusarium graminearum in Maize residues",
-        fontsize=16,
-    )
-    for ax, label in zip([ax1, ax2, ax3], ["a", "b", "c"]):
-        trans = mtransforms.ScaledTranslation(10 / 72, -5 / 72, fig.dpi_scale_trans)
-        ax.text(
-            0,
-            1,
-            label,
-            transform=ax.transAxes + trans,
-            fontsize="medium",
-            verticalalignment="top",
-            fontfamily="serif",
-            bbox=dict(facecolor="0.7", edgecolor="none", pad=3.0),
-        )
 
-    plt.figtext(
-        0.1,
-        0.00,
-        "Figure 4. Evolution of environmental factors asociated with development of Perithecia in $\it{Fusarium }$  $\it{graminearum}$ in the time period of 1950 - 2020 in 20 weather stations in Germany. \n (a)(b) $\it{Fusarium }$  $\it{graminearum}$ development at different temperatures and RH, where 1 on y axis correspods to the optimal temperature / humidity. \n (c) Evolution of the disease risk combined temperature and humidity, calculated yearly as a mean of hourly risk, from maize harvest to wheat bbch75",
+def plot_combined_risk_fusarium(
+    df_airtemp: pd.DataFrame,
+    df_moisture,
+    hist_start: float,
+    hist_end: float,
+    start_dd_mm: str,
+    end_dd_mm: str,
+    moving_average: int,
+    transf: Optional[str] = None,
+    windows: Optional[pd.DataFrame] = None,
+):
+    # Step 1: the yearly risk
+    data = combined_risk_fusarium_data(
+        df_airtemp,
+        df_moisture,
+        hist_start,
+        hist_end,
+        start_dd_mm,
+        end_dd_mm,
+        moving_average,
+        transf=transf,
+        windows=windows,
     )
+    # Step 2: plot
+    fig, axes = combined_risk_fusarium_figure()
+    draw_combined_risk_fusarium(axes, data)
     plt.show()
@@ -1,6 +1,8 @@
 import re
+import numpy as np
 import pandas as pd
-from typing import Tuple
+from functools import lru_cache
+from typing import Optional, Tuple
 
 
 def get_date(link: str) -> Tuple[int, int]:
@@ -18,7 +20,20 @@ def get_date(link: str) -> Tuple[int, int]:
     return (0, 0)
 
 
-def select_time_range(df: pd.DataFrame, start_dd_mm: str, end_dd_mm: str):
+@lru_cache(maxsize=None)
+def season_table(start_dd_mm: str, end_dd_mm: str) -> np.ndarray:
+    """Returns which days of the year are in the window, indexed by month * 100 + day
+
+    The table is computed once for every window, so selecting the same window again costs one lookup.
+    A window ending in an earlier month than it starts (e.g. "10.10" - "20.06") wraps around the end of the year.
+
+    Args:
+        start_dd_mm (str): start date in the dd.mm format
+        end_dd_mm (str): end date in the dd.mm format
+
+    Returns:
+        np.ndarray: a read-only boolean array of length 1232
+    """
     # Step 1: create the time intervals from the input "dd.mm"
     month_start = int(start_dd_mm.split(".")[1])
     month_end = int(end_dd_mm.split(".")[1])
@@ -33,12 +48,155 @@ def select_time_range(df: pd.DataFrame, start_dd_mm: str, end_dd_mm: str):
             i for i in range(1, month_end + 1, 1)
         ]
 
-    # Step 2: clean the dataframe with the created time intervals
-    df = df[df["month"].isin(months)]  # first the months
-    df.drop(
-        df[(df["month"] == month_start) & (df["day"] < day_start)].index, inplace=True
-    )  # then take out the not included days from the first month
-    df.drop(
-        df[(df["month"] == month_end) & (df["day"] > day_end)].index, inplace=True
-    )  # then those from the last month
+    # Step 2: mark the days in the time intervals
+    month_day = np.arange(1232)
+    month, day = month_day // 100, month_day % 100
+    table = (
+        np.isin(month, months)  # first the months
+        & ~((month == month_start) & (day < day_start))
+        # then take out the not included days from the first month
+        & ~((month == month_end) & (day > day_end))
+        # then those from the last month
+    )
+    table.flags.writeable = False
+    return table
+
+
+def season_mask(df: pd.DataFrame, start_dd_mm: str, end_dd_mm: str) -> np.ndarray:
+    """Returns which rows of the dataframe are in the window
+
+    Args:
+        df (pd.DataFrame): data with the month_day column (see dwd_schema.add_time_columns) or the month and day columns
+        start_dd_mm (str): start date in the dd.mm format
+        end_dd_mm (str): end date in the dd.mm format
+
+    Returns:
+        np.ndarray: boolean mask of the rows
+    """
+    if "month_day" in df.columns:
+        month_day = df["month_day"].to_numpy()
+    else:
+        month_day = df["month"].to_numpy(dtype="int16") * 100 + df["day"].to_numpy(
+            dtype="int16"
+        )
+    return season_table(start_dd_mm, end_dd_mm)[month_day]
+
+
+# First day of every month minus one, in a year that is not a leap year
+MONTH_OFFSETS = np.array([0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334])
+
+
+def day_of_year(df: pd.DataFrame) -> np.ndarray:
+    """Returns the day of the year (1 - 366) of every row, from the year, month and day columns"""
+    year = df["year"].to_numpy(dtype="int64")
+    month = df["month"].to_numpy(dtype="int64")
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    return (
+        MONTH_OFFSETS[month] + df["day"].to_numpy(dtype="int64") + (leap & (month > 2))
+    )
+
+
+# More than the days of any year, so that year * YEAR_DAYS + day orders the days of all the years
+YEAR_DAYS = 367
+
+
+def window_seasons(df: pd.DataFrame, windows: pd.DataFrame) -> np.ndarray:
+    """Returns the season of every row: the year of the window of its station the row is in
+
+    The window of a season (year) runs from start_day of start_year to end_day of year. Without
+    the start_year column, a window starting later in the year than it ends (e.g. maize harvest
+    to wheat BBCH75) starts in the year before, so a window covers at most two calendar years.
+    The rows are matched to the windows all at once with searchsorted on a (station, year) key.
+
+    Args:
+        df (pd.DataFrame): data with the STATIONS_ID, year, month and day columns
+        windows (pd.DataFrame): one row per station and season with the STATIONS_ID (e.g. "01639"),
+            year, start_day and end_day (days of the year) columns and optionally start_year,
+            e.g. from bbch_functions.phenology_windows
+
+    Returns:
+        np.ndarray: the season of every row, -1 for the rows outside the windows
+    """
+    seasons = np.full(len(df), -1, dtype="int64")
+    if len(windows) == 0:
+        return seasons
+    # Step 1: the same station codes for the windows and the rows
+    stations = pd.Index(windows["STATIONS_ID"].astype(str).str.zfill(5).unique())
+    window_station = stations.get_indexer(
+        windows["STATIONS_ID"].astype(str).str.zfill(5)
+    )
+    codes, uniques = pd.factorize(df["STATIONS_ID"])
+    lookup = stations.get_indexer(pd.Index(uniques).astype(str).str.zfill(5))
+    row_station = np.where(codes >= 0, lookup[codes], -1)
+    # Step 2: the first and last day of every window, counted from year 0
+    year = windows["year"].to_numpy(dtype="int64")
+    start_day = windows["start_day"].to_numpy(dtype="int64")
+    end_day = windows["end_day"].to_numpy(dtype="int64")
+    if "start_year" in windows.columns:
+        start_year = windows["start_year"].to_numpy(dtype="int64")
+    else:
+        start_year = np.where(start_day > end_day, year - 1, year)
+    window_keys = window_station * 10000 + year
+    order = np.argsort(window_keys, kind="stable")
+    window_keys = window_keys[order]
+    first = (start_year * YEAR_DAYS + start_day)[order]
+    last = (year * YEAR_DAYS + end_day)[order]
+    # Step 3: a row is in the window of its year, or in the one of the next year starting in its year
+    row_year = df["year"].to_numpy(dtype="int64")
+    row_day = row_year * YEAR_DAYS + day_of_year(df)
+    for season in [row_year, row_year + 1]:
+        row_keys = row_station * 10000 + season
+        position = np.minimum(
+            np.searchsorted(window_keys, row_keys), len(window_keys) - 1
+        )
+        inside = (
+            (row_station >= 0)
+            & (window_keys[position] == row_keys)
+            & (row_day >= first[position])
+            & (row_day <= last[position])
+            & (seasons < 0)
+        )
+        seasons[inside] = season[inside]
+    return seasons
+
+
+def window_mask(df: pd.DataFrame, windows: pd.DataFrame) -> np.ndarray:
+    """Returns which rows of the dataframe are in a window of their station (see window_seasons)
+
+    Args:
+        df (pd.DataFrame): data with the STATIONS_ID, year, month and day columns
+        windows (pd.DataFrame): the windows by station and season, see window_seasons
+
+    Returns:
+        np.ndarray: boolean mask of the rows
+    """
+    return window_seasons(df, windows) >= 0
+
+
+def select_time_range(
+    df: pd.DataFrame,
+    start_dd_mm: str,
+    end_dd_mm: str,
+    windows: Optional[pd.DataFrame] = None,
+):
+    """Selects the rows in the window of the year
+
+    Args:
+        df (pd.DataFrame): the data
+        start_dd_mm (str): start date in the dd.mm format
+        end_dd_mm (str): end date in the dd.mm format
+        windows (Optional[pd.DataFrame], optional): windows by station and season (see window_seasons),
+            used instead of the dates when given. The year of the selected rows is then their season,
+            e.g. the hours from the maize harvest of 2006 to BBCH75 of 2007 all count for 2007. Defaults to None.
+
+    Returns:
+        pd.DataFrame: the rows in the window
+    """
+    if windows is None:
+        # take returns a new frame, so adding columns to it does not raise SettingWithCopy
+        return df.take(np.flatnonzero(season_mask(df, start_dd_mm, end_dd_mm)))
+    seasons = window_seasons(df, windows)
+    rows = np.flatnonzero(seasons >= 0)
+    df = df.take(rows)
+    df["year"] = seasons[rows].astype(df["year"].dtype)
     return df
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable
+
+
+def threshold_hours(
+    values, thresholds: Iterable[float], above: bool = True
+) -> np.ndarray:
+    """Compares every hour with all the thresholds at once
+
+    Args:
+        values: hourly values, e.g. the relative humidity RF_STD (%)
+        thresholds (Iterable[float]): the thresholds
+        above (bool, optional): if true an hour counts when the value is >= the threshold (leaf wetness),
+            else when it is <= the threshold (leaf dryness). Defaults to True.
+
+    Returns:
+        np.ndarray: 1.0 or 0.0 for every hour (rows) and threshold (columns), a missing value gives 0.0
+    """
+    values = np.asarray(values, dtype="float64")[:, None]
+    thresholds = np.asarray(list(thresholds), dtype="float64")[None, :]
+    hours = values >= thresholds if above else values <= thresholds
+    return hours.astype("float64")
+
+
+def wet_hours(values, threshold: float = 90) -> np.ndarray:
+    """The leaf wetness of every hour for one threshold (see threshold_hours)
+
+    Args:
+        values: hourly values, e.g. the relative humidity RF_STD (%)
+        threshold (float, optional): the RH threshold (%). Defaults to 90.
+
+    Returns:
+        np.ndarray: 1.0 for a wet hour (value >= threshold), else 0.0
+    """
+    return threshold_hours(values, [threshold])[:, 0]
+
+
+def dew_point_depression(tt, td) -> np.ndarray:
+    """The difference between the air temperature and the dew point (TT - TD), NaN stays NaN"""
+    return np.asarray(tt, dtype="float64") - np.asarray(td, dtype="float64")
+
+
+def annual_fractions(
+    years, values, thresholds: Iterable[float], above: bool = True
+) -> pd.DataFrame:
+    """The fraction of the hours of every year at or above (or at or below) every threshold
+
+    The same as the yearly mean of threshold_hours, without building the hours x thresholds array:
+    the values of every year are sorted once and the thresholds are found with searchsorted, so
+    many thresholds cost about as much as one. The hours with a missing value count as not passing
+    the threshold (but are counted in the hours of the year).
+
+    Args:
+        years: the year of every hour
+        values: hourly values, e.g. the relative humidity RF_STD (%)
+        thresholds (Iterable[float]): the thresholds
+        above (bool, optional): >= the threshold if true, else <= the threshold. Defaults to True.
+
+    Returns:
+        pd.DataFrame: one row per year (index "year"), one column per threshold
+    """
+    thresholds = list(thresholds)
+    bounds = np.asarray(thresholds, dtype="float64")
+    values = np.asarray(values, dtype="float64")
+    codes, unique_years = pd.factorize(np.asarray(years), sort=True)
+    n_years = len(unique_years)
+    hours = np.bincount(codes, minlength=n_years)
+    # Step 1: the values sorted by year, then by value
+    valid = ~np.isnan(values)
+    order = np.lexsort((values[valid], codes[valid]))
+    sorted_values = values[valid][order]
+    starts = np.concatenate(
+        [[0], np.cumsum(np.bincount(codes[valid], minlength=n_years))]
+    )
+    # Step 2: the number of hours passing every threshold, year by year
+    counts = np.empty((n_years, len(thresholds)), dtype="int64")
+    for y in range(n_years):
+        year_values = sorted_values[starts[y] : starts[y + 1]]
+        if above:
+            counts[y] = len(year_values) - np.searchsorted(year_values, bounds, "left")
+        else:
+            counts[y] = np.searchsorted(year_values, bounds, "right")
+    return pd.DataFrame(
+        counts / hours[:, None],
+        index=pd.Index(unique_years, name="year"),
+        columns=thresholds,
+    )
+
+
+def annual_table(
+    df: pd.DataFrame,
+    wet_thresholds: Iterable[float] = (),
+    dry_thresholds: Iterable[float] = (),
+    dew_point: bool = False,
+    rh: str = "RF_STD",
+) -> pd.DataFrame:
+    """The yearly leaf wetness and dryness indices of the data
+
+    Args:
+        df (pd.DataFrame): hourly data with the "year" column, the rh column for the thresholds
+            and the "TT" and "TD" columns for the dew point depression
+        wet_thresholds (Iterable[float], optional): RH thresholds of the wet hours, columns "lw<threshold>". Defaults to ().
+        dry_thresholds (Iterable[float], optional): RH thresholds of the dry hours, columns "dry<threshold>". Defaults to ().
+        dew_point (bool, optional): adds the yearly mean of TT - TD, column "difference". Defaults to False.
+        rh (str, optional): the relative humidity column. Defaults to "RF_STD".
+
+    Returns:
+        pd.DataFrame: one row per year (index "year")
+    """
+    wet_thresholds = list(wet_thresholds)
+    dry_thresholds = list(dry_thresholds)
+    tables = []
+    if wet_thresholds:
+        wet = annual_fractions(df["year"], df[rh], wet_thresholds, above=True)
+        tables.append(wet.rename(columns=lambda i: f"lw{i}"))
+    if dry_thresholds:
+        dry = annual_fractions(df["year"], df[rh], dry_thresholds, above=False)
+        tables.append(dry.rename(columns=lambda i: f"dry{i}"))
+    if dew_point:
+        difference = pd.Series(
+            dew_point_depression(df["TT"], df["TD"]), index=df.index, name="difference"
+        )
+        tables.append(difference.groupby(df["year"]).mean().to_frame())
+    if len(tables) == 0:
+        return pd.DataFrame(index=pd.Index(np.sort(df["year"].unique()), name="year"))
+    return pd.concat(tables, axis=1)
@@ -1,10 +1,195 @@
-from scipy.stats import linregress
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from scipy import stats
+import numpy as np
 import pandas as pd
-from numpy import sqrt
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 
 from source_code.general_functions import select_time_range
+from source_code.disease_models import apply_model, combined_risk
+
+RESULT_COLUMNS = [
+    "station id",
+    "r_value",
+    "gradient",
+    "intercept",
+    "p_value",
+    "conclusion",
+]
+
+
+def yearly_means(df: pd.DataFrame, value: str) -> pd.DataFrame:
+    """Mean of the value for every station and year, in one groupby
+
+    Args:
+        df (pd.DataFrame): hourly data with the STATIONS_ID and year columns
+        value (str): the column to average
+
+    Returns:
+        pd.DataFrame: one row per station and year with the STATIONS_ID, year and value columns,
+        the stations in the order they appear in df
+    """
+    return (
+        df.groupby(["STATIONS_ID", "year"], observed=True, sort=False)[value]
+        .mean()
+        .reset_index()
+    )
+
+
+def _model_column(arrays: Dict[str, np.ndarray], func, column: str) -> np.ndarray:
+    return apply_model(func, arrays[column])
+
+
+def _combined_column(
+    arrays: Dict[str, np.ndarray], func1, func2, transf: Optional[str]
+) -> np.ndarray:
+    return combined_risk(
+        apply_model(func1, arrays["TT_TU"]),
+        apply_model(func2, arrays["RF_STD"]),
+        arrays["RF_STD"],
+        transf,
+    )
+
+
+def _station_yearly_means(
+    folder: str, columns: List[str], start: int, stop: int, compute: Callable
+):
+    # Runs in a worker: reads only the rows of its station from the memory-mapped columns
+    arrays = {
+        col: np.load(os.path.join(folder, col + ".npy"), mmap_mode="r")[start:stop]
+        for col in columns + ["year"]
+    }
+    values = compute(arrays)
+    years, inverse = np.unique(arrays["year"], return_inverse=True)
+    valid = ~np.isnan(values)
+    sums = np.bincount(inverse[valid], values[valid], len(years))
+    counts = np.bincount(inverse[valid], minlength=len(years))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return years, sums / counts
+
+
+def yearly_means_parallel(
+    df: pd.DataFrame,
+    columns: List[str],
+    compute: Callable,
+    value: str,
+    n_workers: int,
+) -> pd.DataFrame:
+    """Like yearly_means, with the model computed station by station in a pool of processes
+
+    The columns are written once to memory-mapped files, sorted by station, so every worker
+    reads only the rows of its station instead of receiving a pickled copy of the data.
+
+    Args:
+        df (pd.DataFrame): hourly data with the STATIONS_ID and year columns
+        columns (List[str]): the columns needed by compute (e.g. ["TT_TU"])
+        compute (Callable): function of a dict {column: array} returning the hourly values,
+            it has to be picklable (a module level function or a partial of one, not a lambda)
+        value (str): the name of the column with the yearly means
+        n_workers (int): number of processes
+
+    Returns:
+        pd.DataFrame: one row per station and year with the STATIONS_ID, year and value columns,
+        the stations in the order they appear in df
+    """
+    codes, stations = pd.factorize(df["STATIONS_ID"])
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(stations) + 1))
+    with tempfile.TemporaryDirectory() as folder:
+        for col in columns + ["year"]:
+            np.save(os.path.join(folder, col + ".npy"), df[col].to_numpy()[order])
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            # map keeps the order of the stations, whatever order the workers finish in
+            results = list(
+                executor.map(
+                    _station_yearly_means,
+                    [folder] * len(stations),
+                    [columns] * len(stations),
+                    bounds[:-1],
+                    bounds[1:],
+                    [compute] * len(stations),
+                )
+            )
+    return pd.DataFrame(
+        {
+            "STATIONS_ID": np.repeat(
+                np.asarray(stations), [len(years) for years, _ in results]
+            ),
+            "year": np.concatenate([years for years, _ in results]),
+            value: np.concatenate([means for _, means in results]),
+        }
+    )
+
+
+def fit_trends(
+    yearly: pd.DataFrame, value: str, year_minus: int = 0, strict: bool = False
+) -> pd.DataFrame:
+    """Fits the linear trend of the value over the years for all the stations at once
+
+    The same results as scipy.stats.linregress station by station, computed with the closed form
+    sums for all the stations together.
+
+    Args:
+        yearly (pd.DataFrame): one row per station and year, e.g. from yearly_means
+        value (str): the column with the yearly values
+        year_minus (int, optional): subtracted from the years (shifts the intercept). Defaults to 0.
+        strict (bool, optional): if true, the conclusion is "unforseen case" when the p value is
+            significant but the gradient is 0 or when it is missing. Defaults to False.
+
+    Returns:
+        pd.DataFrame: one row per station with the columns of RESULT_COLUMNS
+    """
+    codes, stations = pd.factorize(yearly["STATIONS_ID"])
+    x = yearly["year"].to_numpy(dtype="float64") - year_minus
+    y = yearly[value].to_numpy(dtype="float64")
+    n = np.bincount(codes, minlength=len(stations))
+    x_mean = np.bincount(codes, x, len(stations)) / n
+    y_mean = np.bincount(codes, y, len(stations)) / n
+    dx = x - x_mean[codes]
+    dy = y - y_mean[codes]
+    ssxm = np.bincount(codes, dx * dx, len(stations)) / n
+    ssym = np.bincount(codes, dy * dy, len(stations)) / n
+    ssxym = np.bincount(codes, dx * dy, len(stations)) / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gradient = ssxym / ssxm
+        intercept = y_mean - gradient * x_mean
+        r_den = np.sqrt(ssxm * ssym)
+        r_value = np.clip(np.where(r_den == 0, 0.0, ssxym / r_den), -1.0, 1.0)
+        dof = n - 2
+        t = r_value * np.sqrt(dof / ((1.0 - r_value + 1e-20) * (1.0 + r_value + 1e-20)))
+        p_value = 2 * stats.t.sf(np.abs(t), dof)
+    # like linregress: with two years the fit is exact
+    grouped = yearly[value].groupby(codes)
+    y_range = (grouped.max() - grouped.min()).to_numpy()
+    p_value = np.where(n == 2, np.where(y_range == 0, 1.0, 0.0), p_value)
+    # no fit with a single year or with NaN in the yearly values
+    no_fit = (ssxm == 0) | np.isnan(ssxym)
+    gradient[no_fit] = np.nan
+    intercept[no_fit] = np.nan
+    p_value[no_fit] = np.nan
+
+    significant = p_value < 0.05
+    conclusion = np.select(
+        [significant & (gradient > 0), significant & (gradient < 0)],
+        ["significant", "significant but decreasing risk"],
+        "non-significant",
+    )
+    if strict:
+        conclusion[~(p_value >= 0.05) & ~significant] = "unforseen case"
+        conclusion[significant & (gradient == 0)] = "unforseen case"
+    return pd.DataFrame(
+        {
+            "station id": np.asarray(stations),
+            "r_value": r_value,
+            "gradient": gradient,
+            "intercept": intercept,
+            "p_value": p_value,
+            "conclusion": conclusion,
+        },
+        columns=RESULT_COLUMNS,
+    )
 
 
 def linear_model_temperature(
@@ -13,49 +198,19 @@ def linear_model_temperature(
     end_dd_mm: str,
     func,
     year_minus: int = 0,
+    n_workers: Optional[int] = None,
+    windows: Optional[pd.DataFrame] = None,
 ):
-    results = pd.DataFrame(
-        columns=[
-            "station id",
-            "r_value",
-            "gradient",
-            "intercept",
-            "p_value",
-            "conclusion",
-        ]
+    df = select_time_range(
+        df_airtemp, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
     )
-    df = df_airtemp.copy()
-    for station in df.STATIONS_ID.unique():
-        save_station = station
-        df = df_airtemp.copy()
-        df = df[df["STATIONS_ID"] == station]
-        df = select_time_range(df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm)
-        df["useful_t"] = df.TT_TU.apply(func)
-
-        df = df.groupby(["year"]).mean().reset_index()
-
-        x = [i - year_minus for i in df.year]
-        y = df.useful_t
-        gradient, intercept, r_value, p_value, std_err = stats.linregress(x, y)
-        if p_value < 0.05 and gradient > 0:
-            verdict = "significant"
-        elif p_value < 0.05 and gradient < 0:
-            verdict = "significant but decreasing risk"
-        else:  # p_value > 0.05:
-            verdict = "non-significant"
-
-        results_new_row = pd.DataFrame(
-            {
-                "station id": [save_station],
-                "r_value": [r_value],
-                "gradient": [gradient],
-                "intercept": [intercept],
-                "p_value": [p_value],
-                "conclusion": [verdict],
-            }
-        )
-        results = pd.concat([results, results_new_row], ignore_index=True)
-    return results
+    if n_workers is not None:
+        compute = partial(_model_column, func=func, column="TT_TU")
+        yearly = yearly_means_parallel(df, ["TT_TU"], compute, "useful_t", n_workers)
+    else:
+        df["useful_t"] = apply_model(func, df.TT_TU)
+        yearly = yearly_means(df, "useful_t")
+    return fit_trends(yearly, "useful_t", year_minus)
 
 
 def linear_model_moisture(
@@ -64,52 +219,22 @@ def linear_model_moisture(
     end_dd_mm: str,
     func,
     year_minus: int = 0,
+    n_workers: Optional[int] = None,
+    windows: Optional[pd.DataFrame] = None,
 ):
-    results = pd.DataFrame(
-        columns=[
-            "station id",
-            "r_value",
-            "gradient",
-            "intercept",
-            "p_value",
-            "conclusion",
-        ]
+    df = df_moisture[df_moisture["hour"].isin([3, 6, 9, 12, 15, 18, 21])]
+    df = select_time_range(
+        df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
     )
-    df = df_moisture.copy()
-    for station in df.STATIONS_ID.unique():
-        save_station = station
-        df = df_moisture.copy()
-        df = df[df["STATIONS_ID"] == station]
-        df = df[df["hour"].isin([3, 6, 9, 12, 15, 18, 21])]
-        df = select_time_range(df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm)
-        df["useful_humidity"] = df.RF_STD.apply(func)
-
-        df = df.groupby(["year"]).mean().reset_index()
-
-        x = [i - year_minus for i in df.year]
-        y = df.useful_humidity
-        gradient, intercept, r_value, p_value, std_err = stats.linregress(x, y)
-        if p_value < 0.05 and gradient > 0:
-            verdict = "significant"
-        elif p_value < 0.05 and gradient < 0:
-            verdict = "significant but decreasing risk"
-        elif p_value >= 0.05:
-            verdict = "non-significant"
-        else:
-            verdict = "unforseen case"
-
-        results_new_row = pd.DataFrame(
-            {
-                "station id": [save_station],
-                "r_value": [r_value],
-                "gradient": [gradient],
-                "intercept": [intercept],
-                "p_value": [p_value],
-                "conclusion": [verdict],
-            }
+    if n_workers is not None:
+        compute = partial(_model_column, func=func, column="RF_STD")
+        yearly = yearly_means_parallel(
+            df, ["RF_STD"], compute, "useful_humidity", n_workers
         )
-        results = pd.concat([results, results_new_row], ignore_index=True)
-    return results
+    else:
+        df["useful_humidity"] = apply_model(func, df.RF_STD)
+        yearly = yearly_means(df, "useful_humidity")
+    return fit_trends(yearly, "useful_humidity", year_minus, strict=True)
 
 
 def linear_model_combined(
@@ -121,24 +246,15 @@ def linear_model_combined(
     func2,
     year_minus: int = 0,
     transf: Optional[str] = None,
+    n_workers: Optional[int] = None,
+    windows: Optional[pd.DataFrame] = None,
 ):
-    results = pd.DataFrame(
-        columns=[
-            "station id",
-            "r_value",
-            "gradient",
-            "intercept",
-            "p_value",
-            "conclusion",
-        ]
-    )
-
     # Step 1: create the time intervals from the input "dd.mm"
     df_airtemp = select_time_range(
-        df_airtemp, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm
+        df_airtemp, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
     )
     df_moisture = select_time_range(
-        df_moisture, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm
+        df_moisture, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
     )
     # Step 2: apply disease models
     # Step 2.1: merge the dataframes on the needed parameters
@@ -149,62 +265,23 @@ def linear_model_combined(
         on=["MESS_DATUM", "STATIONS_ID", "year", "month", "day", "hour"],
     )
     df_merged = df_merged[common_cols + ["TT_TU", "RF_STD"]]
+    if n_workers is not None:
+        # Steps 2.2 - 2.4 for every station in a separate process
+        compute = partial(_combined_column, func1=func1, func2=func2, transf=transf)
+        yearly = yearly_means_parallel(
+            df_merged, ["TT_TU", "RF_STD"], compute, "combined_risk", n_workers
+        )
+        return fit_trends(yearly, "combined_risk", year_minus)
     # Step 2.2: the model for temperature
-    df_merged["t_risk"] = df_merged.TT_TU.apply(func1)
+    df_merged["t_risk"] = apply_model(func1, df_merged.TT_TU)
 
     # Step 2.3: the model for moisture
-    df_merged["rh_risk"] = df_merged.RF_STD.apply(func2)
+    df_merged["rh_risk"] = apply_model(func2, df_merged.RF_STD)
 
     # Step 2.4: overall risk (combined)
-    if transf == None:
-        df_merged["combined_risk"] = df_merged.apply(
-            lambda x: (x["rh_risk"] * x["t_risk"]), axis=1
-        )
-    elif transf == "sqrt":
-        df_merged["combined_risk"] = df_merged.apply(
-            lambda x: sqrt(x["rh_risk"] * x["t_risk"]), axis=1
-        )
-    elif transf == "LTRH80":
-        df_merged["combined_risk"] = df_merged.apply(
-            lambda x: x["t_risk"] if x["RF_STD"] > 80 else 0, axis=1
-        )
-    elif transf == "LTRH90":
-        df_merged["combined_risk"] = df_merged.apply(
-            lambda x: x["t_risk"] if x["RF_STD"] > 90 else 0, axis=1
-        )
-    df = df_merged.copy()
-    for station in df.STATIONS_ID.unique():
-        save_station = station
-        df = df_merged.copy()
-
-        # Selecting the station from the dataframe
-        df = df[df["STATIONS_ID"] == station]
-
-        # Grouping by year
-        df = df.groupby(["year"]).mean().reset_index()
-
-        # Calibrating the model
-        x = [i - year_minus for i in df.year]
-
-        # Taking y for the model
-        y = df.combined_risk
-        gradient, intercept, r_value, p_value, std_err = stats.linregress(x, y)
-        if p_value < 0.05 and gradient > 0:
-            verdict = "significant"
-        elif p_value < 0.05 and gradient < 0:
-            verdict = "significant but decreasing risk"
-        else:  # p_value > 0.05:
-            verdict = "non-significant"
-
-        results_new_row = pd.DataFrame(
-            {
-                "station id": [save_station],
-                "r_value": [r_value],
-                "gradient": [gradient],
-                "intercept": [intercept],
-                "p_value": [p_value],
-                "conclusion": [verdict],
-            }
-        )
-        results = pd.concat([results, results_new_row], ignore_index=True)
-    return results
+    df_merged["combined_risk"] = combined_risk(
+        df_merged.t_risk, df_merged.rh_risk, df_merged.RF_STD, transf
+    )
+    # Step 3: fit all the stations at once
+    yearly = yearly_means(df_merged, "combined_risk")
+    return fit_trends(yearly, "combined_risk", year_minus)
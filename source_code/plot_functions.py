@@ -1,13 +1,15 @@
 import pandas as pd
 
-import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib.transforms as mtransforms
-from typing import List
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from typing import Dict, List, Optional, Tuple
 from source_code.general_functions import select_time_range
+from source_code.leaf_wetness import annual_table
 
 
-def plot_optimal_temperature(
+def optimal_temperature_data(
     df: pd.DataFrame,
     temp_min: float,
     temp_max: float,
@@ -16,78 +18,144 @@ def plot_optimal_temperature(
     start_dd_mm: str,
     end_dd_mm: str,
     moving_average: int,
-):
-    """Creates the plot for the optimal temperature
+    windows: Optional[pd.DataFrame] = None,
+) -> Dict:
+    """The yearly share of hours with optimal temperature drawn by plot_optimal_temperature
 
-    Args:
-        df (pd.DataFrame): the dataframe with hourly temperature
-        temp_min (float): minimum of temperature interval
-        temp_max (float): maximum of temperature interval
-        hist_start (float): start of the reference period
-        hist_end (float): end of the reference period
-        start_dd_mm (str): start date in the dd.mm format
-        end_dd_mm (str): end date in the dd.mm format
-        moving_average (int): the number of years for the moving average (e.g.7)
+    Returns:
+        Dict: the yearly frame ("yearly"), the historic levels and the labels
     """
 
     # Step 1: create the time intervals from the input "dd.mm"
-    df = select_time_range(df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm)
+    df = select_time_range(
+        df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
+    )
     # Step 2: apply the function
     df["useful_t"] = df.TT_TU.apply(
         lambda x: 1 if (x >= temp_min and x <= temp_max) else 0
     )
 
     # Step 3: process and prepare for plotting
-    df = df.groupby(["year"]).mean()
-    avg_hist = df[(df.index <= hist_end) & (df.index >= hist_start)]["useful_t"].mean()
-    max_hist = df[(df.index <= hist_end) & (df.index >= hist_start)]["useful_t"].max()
-    min_hist = df[(df.index <= hist_end) & (df.index >= hist_start)]["useful_t"].min()
+    df = df.groupby("year")[["TT_TU", "useful_t"]].mean()
+    hist = df[(df.index <= hist_end) & (df.index >= hist_start)]["useful_t"]
     df[f"{moving_average}years_average"] = df.useful_t.rolling(moving_average).mean()
+    return {
+        "yearly": df,
+        "avg_hist": hist.mean(),
+        "max_hist": hist.max(),
+        "min_hist": hist.min(),
+        "hist_start": hist_start,
+        "hist_end": hist_end,
+        "moving_average": moving_average,
+    }
 
-    # Step 4: plot
-    plt.figure(figsize=(15, 8))
-    sns.lineplot(
-        x="year", y="useful_t", data=df, label="yearly optimal hours %", alpha=0.55
-    )
-    sns.lineplot(
-        x="year",
-        y=f"{moving_average}years_average",
-        data=df,
-        label=f"{moving_average} years average",
-        color="orange",
-    )
-    sns.lineplot(
-        x=df.index,
-        y=min_hist,
-        linestyle="dashed",
-        label=f"minimum in the historical period ({hist_start}-{hist_end})",
-    )
-    sns.lineplot(
-        x=df.index,
-        y=avg_hist,
-        linestyle="dashed",
-        label=f"average in the historical period ({hist_start}-{hist_end})",
-    )
-    sns.lineplot(
-        x=df.index,
-        y=max_hist,
-        linestyle="dashed",
-        label=f"maximum period in the historical period ({hist_start}-{hist_end})",
-    )
-    plt.ylabel("% of hours with optimal temperature")
-    # plt.plot([hist_end,hist_end], [-0.00,0.05], lw=2, color = "0.65", label = "historical period (left)")
 
-    plt.figtext(
+def new_figure(figsize: Tuple[float, float], headless: bool = False) -> Figure:
+    """A pyplot figure, or with headless a figure drawn by Agg that pyplot does not know about
+
+    The headless figures never open a window nor change the backend of pyplot, and are freed
+    as soon as they are not referenced anymore.
+    """
+    if not headless:
+        return plt.figure(figsize=figsize)
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def optimal_temperature_figure(
+    temp_min: float,
+    temp_max: float,
+    hist_start: float,
+    hist_end: float,
+    start_dd_mm: str,
+    end_dd_mm: str,
+    headless: bool = False,
+) -> Tuple[plt.Figure, List[plt.Axes]]:
+    """The figure of plot_optimal_temperature without the data, to be drawn on by draw_optimal_temperature"""
+    fig = new_figure((15, 8), headless)
+    ax = fig.add_subplot()
+    fig.text(
         0.15,
         0.021,
         f""" \n Figure 1. Variation of optimal temperature % for Septoria tritici in Germany from 1950 - 2020 compared to the reference period of ({hist_start} - {hist_end}). Optimal temperature 
         \n is considered when air  temperature is between {temp_min} and {temp_max} degrees Celsius. The yearly time range is between sowing of wheat and harvesting in Germany, which is considered: {start_dd_mm} - {end_dd_mm},
         \n corresponding to the interval when 90% of the crop was is in that stage """,
     )
+    return fig, [ax]
+
+
+def draw_optimal_temperature(axes: List[plt.Axes], data: Dict):
+    """Draws the yearly share of optimal_temperature_data on the axes of optimal_temperature_figure"""
+    ax = axes[0]
+    df = data["yearly"]
+    hist_start, hist_end = data["hist_start"], data["hist_end"]
+    moving_average = data["moving_average"]
+    ax.plot(df.index, df["useful_t"], label="yearly optimal hours %", alpha=0.55)
+    ax.plot(
+        df.index,
+        df[f"{moving_average}years_average"],
+        label=f"{moving_average} years average",
+        color="orange",
+    )
+    for level, label, color in [
+        ("min_hist", "minimum in the historical period", "black"),
+        ("avg_hist", "average in the historical period", "green"),
+        ("max_hist", "maximum period in the historical period", "red"),
+    ]:
+        ax.axhline(
+            data[level],
+            color=color,
+            linestyle="dashed",
+            label=f"{label} ({hist_start}-{hist_end})",
+        )
+    ax.legend()
+    ax.set_xlabel("year")
+    ax.set_ylabel("% of hours with optimal temperature")
+
+
+def plot_optimal_temperature(
+    df: pd.DataFrame,
+    temp_min: float,
+    temp_max: float,
+    hist_start: float,
+    hist_end: float,
+    start_dd_mm: str,
+    end_dd_mm: str,
+    moving_average: int,
+    windows: Optional[pd.DataFrame] = None,
+):
+    """Creates the plot for the optimal temperature
+
+    Args:
+        df (pd.DataFrame): the dataframe with hourly temperature
+        temp_min (float): minimum of temperature interval
+        temp_max (float): maximum of temperature interval
+        hist_start (float): start of the reference period
+        hist_end (float): end of the reference period
+        start_dd_mm (str): start date in the dd.mm format
+        end_dd_mm (str): end date in the dd.mm format
+        moving_average (int): the number of years for the moving average (e.g.7)
+    """
+    data = optimal_temperature_data(
+        df,
+        temp_min,
+        temp_max,
+        hist_start,
+        hist_end,
+        start_dd_mm,
+        end_dd_mm,
+        moving_average,
+        windows=windows,
+    )
+    fig, axes = optimal_temperature_figure(
+        temp_min, temp_max, hist_start, hist_end, start_dd_mm, end_dd_mm
+    )
+    draw_optimal_temperature(axes, data)
     plt.show()
 
 
-def plot_lw_RHt(
+def lw_RHt_data(
     df: pd.DataFrame,
     thresholds: List[float],
     hist_start: float,
@@ -95,51 +163,94 @@ def plot_lw_RHt(
     start_dd_mm: str,
     end_dd_mm: str,
     moving_average: int,
-    hours: List[int],
-):
+    windows: Optional[pd.DataFrame] = None,
+) -> Dict:
+    """The yearly leaf wetness for every RH threshold drawn by plot_lw_RHt
+
+    Returns:
+        Dict: the yearly frame ("yearly") and the labels
+    """
 
     # Step 1: create the time intervals from the input "dd.mm"
-    df = select_time_range(df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm)
-    # Step 2: apply the function
-    for i in thresholds:
-        df[f"lw{i}"] = df["RF_STD"].apply(lambda x: 1 if float(x) >= i else 0)
+    df = select_time_range(
+        df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
+    )
+    # Step 2: the yearly fraction of wet hours, for all the thresholds at once
+    df = annual_table(df, wet_thresholds=thresholds)
 
     # Step 3: process and prepare for plotting
-    df = df.groupby("year").mean()
     for i in thresholds:
         df[f"lw{i}_7years_average"] = df[f"lw{i}"].rolling(moving_average).mean()
         df[f"avg_hist_lw{i}"] = df[(df.index >= hist_start) & (df.index <= hist_end)][
             f"lw{i}"
         ].mean()
+    return {"yearly": df, "thresholds": thresholds, "moving_average": moving_average}
 
-    # Step 4: plot
-    plt.figure(figsize=(15, 7.5))
-    for i in thresholds:
-        sns.lineplot(
-            x="year",
-            y=f"lw{i}",
-            data=df,
-            label=f"leaf humidity treshold set at RH = {i}",
-            alpha=0.33,
-        )
-        sns.lineplot(
-            x="year", y=f"lw{i}_7years_average", data=df, label=f"lw{i}_7years_average"
-        )
-        sns.lineplot(
-            x="year",
-            y=f"avg_hist_lw{i}",
-            data=df,
-            linestyle="dashed",
-            label=f"{moving_average} years moving average for lw{i}",
-        )
-    plt.title(
+
+def lw_RHt_figure(
+    hours: List[int], headless: bool = False
+) -> Tuple[plt.Figure, List[plt.Axes]]:
+    """The figure of plot_lw_RHt without the data, to be drawn on by draw_lw_RHt"""
+    fig = new_figure((15, 7.5), headless)
+    ax = fig.add_subplot()
+    ax.set_title(
         f"Leaf wetness for different RH treshold measured in the interval {hours}"
     )
-    plt.figtext(
+    fig.text(
         0.15,
         0.031,
         f"Fig 4. Leaf wetness events from RH leaf wetness model applied for different RH tresholds on data from 1950 - 2019  in Germany.",
     )
+    return fig, [ax]
+
+
+def draw_lw_RHt(axes: List[plt.Axes], data: Dict):
+    """Draws the yearly leaf wetness of lw_RHt_data on the axes of lw_RHt_figure"""
+    ax = axes[0]
+    df = data["yearly"]
+    for i in data["thresholds"]:
+        (line,) = ax.plot(
+            df.index,
+            df[f"lw{i}"],
+            label=f"leaf humidity treshold set at RH = {i}",
+            alpha=0.33,
+        )
+        ax.plot(df.index, df[f"lw{i}_7years_average"], label=f"lw{i}_7years_average")
+        # the historic average of the threshold, in the color of its yearly line
+        ax.axhline(
+            df[f"avg_hist_lw{i}"].mean(),
+            color=line.get_color(),
+            linestyle="dashed",
+            label=f"{data['moving_average']} years moving average for lw{i}",
+        )
+    ax.legend()
+    ax.set_xlabel("year")
+    ax.set_ylabel("% of hours with leaf wetness")
+
+
+def plot_lw_RHt(
+    df: pd.DataFrame,
+    thresholds: List[float],
+    hist_start: float,
+    hist_end: float,
+    start_dd_mm: str,
+    end_dd_mm: str,
+    moving_average: int,
+    hours: List[int],
+    windows: Optional[pd.DataFrame] = None,
+):
+    data = lw_RHt_data(
+        df,
+        thresholds,
+        hist_start,
+        hist_end,
+        start_dd_mm,
+        end_dd_mm,
+        moving_average,
+        windows=windows,
+    )
+    fig, axes = lw_RHt_figure(hours)
+    draw_lw_RHt(axes, data)
     plt.show()
 
 
@@ -147,47 +258,48 @@ def plot_lw_dpd(
     df,
     start_dd_mm: str,
     end_dd_mm: str,
+    windows: Optional[pd.DataFrame] = None,
 ):
 
     # Step 1: create the time intervals from the input "dd.mm"
-    df = select_time_range(df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm)
+    df = select_time_range(
+        df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
+    )
 
-    # Step 2: apply the function
-    df["difference"] = df.apply(lambda x: (x["TT"] - x["TD"]), axis=1)
+    # Step 2: the yearly mean of the dew point depression
+    df = annual_table(df, dew_point=True)
 
     # Step 3: process and prepare for plotting
-    df = df.groupby("year").mean()
     avg50_79 = df[df.index <= 1979]["difference"].mean()
     max50_79 = df[df.index <= 1979]["difference"].max()
     min50_79 = df[df.index <= 1979]["difference"].min()
     df["7yrs_average"] = df.difference.rolling(7).mean()
 
     # Step 4: plot
-    plt.figure(figsize=(15, 8))
-    sns.lineplot(
-        x=df.index, y=df["difference"]
-    )  # , label = "average yearly difference")
-    sns.lineplot(
-        x=df.index, y=df["7yrs_average"], label="7 years average", color="orange"
-    )
-    sns.lineplot(
-        x=df.index,
-        y=min50_79,
+    fig, ax = plt.subplots(figsize=(15, 8))
+    ax.plot(df.index, df["difference"])  # , label = "average yearly difference")
+    ax.plot(df.index, df["7yrs_average"], label="7 years average", color="orange")
+    ax.axhline(
+        min50_79,
+        color="black",
         linestyle="dashed",
         label="minimum in the historical period (1950-1979)",
     )
-    sns.lineplot(
-        x=df.index,
-        y=avg50_79,
+    ax.axhline(
+        avg50_79,
+        color="green",
         linestyle="dashed",
         label="average in the historical period (1950-1979)",
     )
-    sns.lineplot(
-        x=df.index,
-        y=max50_79,
+    ax.axhline(
+        max50_79,
+        color="red",
         linestyle="dashed",
         label="maximum perios in the historical period (1950-1979)",
     )
+    ax.legend()
+    ax.set_xlabel("year")
+    ax.set_ylabel("difference")
 
     plt.figtext(
         0.15,
@@ -197,31 +309,76 @@ def plot_lw_dpd(
     plt.show()
 
 
-def plot_dryness(df, start_dd_mm: str, end_dd_mm: str, treshhold: float = 70):
+def dryness_data(
+    df,
+    start_dd_mm: str,
+    end_dd_mm: str,
+    treshhold: float = 70,
+    windows: Optional[pd.DataFrame] = None,
+) -> Dict:
+    """The yearly leaf dryness drawn by plot_dryness
+
+    Returns:
+        Dict: the yearly frame ("yearly") and the historic average
+    """
 
     # Step 1: create the time intervals from the input "dd.mm"
-    df = select_time_range(df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm)
+    df = select_time_range(
+        df, start_dd_mm=start_dd_mm, end_dd_mm=end_dd_mm, windows=windows
+    )
 
-    # Step 2: apply the function
-    df[f"dry_leaf"] = df["RF_STD"].apply(lambda x: 1 if float(x) <= treshhold else 0)
+    # Step 2: the yearly fraction of dry hours
+    df = annual_table(df, dry_thresholds=[treshhold])
+    df = df.rename(columns={f"dry{treshhold}": "dry_leaf"})
 
     # Step 3: process and prepare for plotting
-    df = df.groupby("year").mean()
     df["7yrs_average"] = df.dry_leaf.rolling(7).mean()
     avg50_79 = df[df.index <= 1979]["dry_leaf"].mean()
+    return {"yearly": df, "avg50_79": avg50_79}
 
-    # Step 3: plot
-    plt.figure(figsize=(15, 7))
-    sns.lineplot(
-        x=df.index, y=avg50_79, label="historical (1950-1979) average dry leaf"
-    )
-    sns.lineplot(x="year", y="dry_leaf", data=df, label="yearly dry leaf")
-    sns.lineplot(x="year", y="7yrs_average", data=df, label="7 years average dry leaf")
-    plt.title(f"Leaf dryness for RH = {treshhold} threshhold")
-    plt.ylabel("% of hours with leaf dryness")
-    plt.figtext(
+
+def dryness_figure(
+    treshhold: float = 70, headless: bool = False
+) -> Tuple[plt.Figure, List[plt.Axes]]:
+    """The figure of plot_dryness without the data, to be drawn on by draw_dryness"""
+    fig = new_figure((15, 7), headless)
+    ax = fig.add_subplot()
+    ax.set_title(f"Leaf dryness for RH = {treshhold} threshhold")
+    fig.text(
         0.15,
         0.031,
         f"Fig 5. Leaf dryness events from RH leaf wetness model applied for treshold {treshhold} on data from 1950 - 2019  in Germany.",
     )
+    return fig, [ax]
+
+
+def draw_dryness(axes: List[plt.Axes], data: Dict):
+    """Draws the yearly leaf dryness of dryness_data on the axes of dryness_figure"""
+    ax = axes[0]
+    df = data["yearly"]
+    ax.axhline(
+        data["avg50_79"],
+        color="green",
+        linestyle="dashed",
+        label="historical (1950-1979) average dry leaf",
+    )
+    ax.plot(df.index, df["dry_leaf"], label="yearly dry leaf")
+    ax.plot(df.index, df["7yrs_average"], label="7 years average dry leaf")
+    ax.legend()
+    ax.set_xlabel("year")
+    ax.set_ylabel("% of hours with leaf dryness")
+
+
+def plot_dryness(
+    df,
+    start_dd_mm: str,
+    end_dd_mm: str,
+    treshhold: float = 70,
+    windows: Optional[pd.DataFrame] = None,
+):
+    data = dryness_data(
+        df, start_dd_mm, end_dd_mm, treshhold=treshhold, windows=windows
+    )
+    fig, axes = dryness_figure(treshhold)
+    draw_dryness(axes, data)
     plt.show()
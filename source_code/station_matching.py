@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from typing import Optional
+
+PHENOLOGY_STATIONS_URL = "https://opendata.dwd.de/climate_environment/CDC/observations_germany/phenology/annual_reporters/crops/historical/PH_Beschreibung_Phaenologie_Stationen_Jahresmelder.txt"
+EARTH_RADIUS = 6371.0  # km
+
+
+def load_phenology_stations(path: str = PHENOLOGY_STATIONS_URL) -> pd.DataFrame:
+    """Loads the phenology reporters (Jahresmelder) with their coordinates
+
+    Args:
+        path (str, optional): the DWD description of the reporters. Defaults to PHENOLOGY_STATIONS_URL.
+
+    Returns:
+        pd.DataFrame: one row per reporter with the id (e.g. "01639"), lat, lon and name columns
+    """
+    stations = pd.read_csv(path, sep=";", encoding="latin1", dtype=str)
+    stations.columns = stations.columns.str.strip()
+    # the coordinate columns are "geograph.Breite" and "geograph.Laenge"
+    lat = [column for column in stations.columns if column.endswith("Breite")][0]
+    lon = [column for column in stations.columns if column.endswith("Laenge")][0]
+    return pd.DataFrame(
+        {
+            "id": stations["Stations_id"].str.strip().str.zfill(5),
+            "lat": stations[lat].str.strip().astype(float),
+            "lon": stations[lon].str.strip().astype(float),
+            "name": stations["Stationsname"].str.strip(),
+        }
+    )
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    """The points on the unit sphere (x, y, z) of the coordinates in degrees
+
+    The straight (chord) distance between two points grows with the great circle distance,
+    so the nearest points in xyz are the nearest on the earth.
+    """
+    lat = np.radians(np.asarray(lat, dtype="float64"))
+    lon = np.radians(np.asarray(lon, dtype="float64"))
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+def nearest_stations(
+    reporters: pd.DataFrame,
+    stations: pd.DataFrame,
+    k: int = 3,
+    max_distance: float = 50.0,
+    power: Optional[float] = 2.0,
+) -> pd.DataFrame:
+    """Matches every phenology reporter with its k nearest weather stations
+
+    Args:
+        reporters (pd.DataFrame): the reporters with the id, lat and lon columns (load_phenology_stations)
+        stations (pd.DataFrame): the weather stations with the id, lat and lon columns (station_metrics.load_stations)
+        k (int, optional): the number of stations per reporter. Defaults to 3.
+        max_distance (float, optional): the stations further away are not matched, in km. Defaults to 50.0.
+        power (Optional[float], optional): the power of the inverse distance weights, None gives the
+            same weight to all the stations of a reporter. Defaults to 2.0.
+
+    Returns:
+        pd.DataFrame: one row per match with the reporter_id, id (of the weather station), rank
+        (0 for the nearest), distance (km) and weight (summing to 1 for every reporter) columns;
+        the reporters without any station within max_distance are left out
+    """
+    # Step 1: the tree of the weather stations on the unit sphere
+    tree = cKDTree(unit_vectors(stations["lat"], stations["lon"]))
+    k = min(k, len(stations))
+    # Step 2: the k nearest stations of all the reporters at once, within the chord of max_distance
+    chord = 2 * np.sin(max_distance / (2 * EARTH_RADIUS))
+    chords, indices = tree.query(
+        unit_vectors(reporters["lat"], reporters["lon"]),
+        k=k,
+        distance_upper_bound=chord * (1 + 1e-12),
+    )
+    chords = np.asarray(chords).reshape(len(reporters), k)
+    indices = np.asarray(indices).reshape(len(reporters), k)
+    # Step 3: one row per match, the missing neighbours have an infinite distance
+    found = np.isfinite(chords)
+    rows, ranks = np.nonzero(found)
+    distance = 2 * EARTH_RADIUS * np.arcsin(np.minimum(chords[found] / 2, 1))
+    matches = pd.DataFrame(
+        {
+            "reporter_id": reporters["id"].to_numpy()[rows],
+            "id": stations["id"].to_numpy()[indices[found]],
+            "rank": ranks,
+            "distance": distance,
+        }
+    )
+    # Step 4: the weights, a station at the same place as the reporter gets all the weight
+    if power is None:
+        weight = np.ones(len(matches))
+    else:
+        with np.errstate(divide="ignore"):
+            weight = distance ** (-power)
+        exact = np.isinf(weight)
+        on_site = pd.Series(exact).groupby(rows).transform("any").to_numpy()
+        weight = np.where(on_site, exact.astype("float64"), weight)
+    matches["weight"] = (
+        weight / pd.Series(weight).groupby(rows).transform("sum").to_numpy()
+    )
+    return matches
+
+
+def weather_windows(windows: pd.DataFrame, matches: pd.DataFrame) -> pd.DataFrame:
+    """Moves the windows of the phenology reporters to the matched weather stations
+
+    The window of a weather station in a season is the weighted mean of the windows of the
+    reporters matched with it, rounded to the day (the matches without weight are left out).
+
+    Args:
+        windows (pd.DataFrame): the STATIONS_ID (of the reporter), year, start_day and end_day columns,
+            and optionally start_year (bbch_functions.phenology_windows)
+        matches (pd.DataFrame): the matches of the reporters (nearest_stations)
+
+    Returns:
+        pd.DataFrame: the same columns, with the STATIONS_ID of the weather stations
+    """
+    paired = windows.merge(
+        matches.loc[matches["weight"] > 0, ["reporter_id", "id", "weight"]],
+        left_on="STATIONS_ID",
+        right_on="reporter_id",
+    )
+    days = ["start_day", "end_day"]
+    keys = [column for column in ["year", "start_year"] if column in windows.columns]
+    weighted = paired[days].mul(paired["weight"], axis=0)
+    weighted["weight"] = paired["weight"]
+    sums = weighted.groupby([paired["id"]] + [paired[key] for key in keys]).sum()
+    result = sums[days].div(sums["weight"], axis=0).round().astype("int64")
+    return result.reset_index().rename(columns={"id": "STATIONS_ID"})
@@ -0,0 +1,147 @@
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Iterable, Optional, Tuple
+
+from source_code.aggregate_cube import Cube
+from source_code.lm_fusarium import fit_trends
+
+STATIONS_PATH = "downloads/hourly/stations_description.csv"
+
+# The conclusions of the linear models as signs, and the categories of the signs
+# (combined, temperature, humidity), as in results/category_summary.csv
+SIGNS = {
+    "significant": "+",
+    "significant but decreasing risk": "-",
+    "non-significant": "0",
+}
+CATEGORIES = {
+    "+++": "1A",  # all risks increased
+    "++0": "1B",  # combined and temperature increased
+    "++-": "1C",  # combined, temperature increased, humidity did not
+    "0++": "2A",  # temperature and humidity increased, but combined not significant
+    "0+0": "2B",  # temperature risk increased, humidity constant, combined not significant
+    "0+-": "2C",  # temperature risk increased, humidity decreased, combined not significant
+    "-+0": "3A",  # decreasing but temperature increased
+    "-+-": "3B",  # temperature increasing, humidity and combined decreasing
+    "-++": "3C",  # risk decreasing, both parameters increasing
+    "000": "AN",  # anomaly, sky station
+}
+CATEGORY_COLORS = {
+    "1A": "#ff3300",
+    "1B": "#ff5c33",
+    "1C": "#ff5c99",
+    "2A": "#003d99",
+    "2B": "#0066ff",
+    "2C": "#80b3ff",
+    "3A": "#009900",
+    "3B": "#80ff80",
+    "3C": "#80ff00",
+    "AN": "#000066",
+}
+# The metrics of the cube giving the category: combined, temperature and humidity risk
+CATEGORY_METRICS = ("combined_sqrt", "t_risk", "rh_risk")
+
+
+def load_stations(path: str = STATIONS_PATH) -> pd.DataFrame:
+    """Loads the DWD hourly stations with their coordinates
+
+    Args:
+        path (str, optional): the description of the stations. Defaults to STATIONS_PATH.
+
+    Returns:
+        pd.DataFrame: one row per station with the id (e.g. "01550"), lat, lon and name columns
+    """
+    stations = pd.read_csv(path)
+    return pd.DataFrame(
+        {
+            "id": stations["id"].astype(str).str.zfill(5),
+            "lat": stations["latitude"],
+            "lon": stations["longitude"],
+            "name": stations["name"],
+        }
+    )
+
+
+def yearly_matrix(
+    cube: Cube, metric: str, years: Tuple[int, int], months: Tuple[int, int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The yearly means of the metric in the months for all the stations of the cube at once
+
+    Args:
+        cube (Cube): the cube
+        metric (str): the metric (e.g. "t_risk")
+        years (Tuple[int, int]): first and last year
+        months (Tuple[int, int]): first and last month (1 - 12)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the years and the means (stations x years, NaN without data)
+    """
+    k = cube.metrics.index(metric)
+    first = max(years[0] - cube.first_year, 0)
+    last = min(years[1] - cube.first_year, cube.sums.shape[1] - 1)
+    sums = cube.sums[:, first : last + 1, months[0] - 1 : months[1], k].sum(axis=2)
+    counts = cube.counts[:, first : last + 1, months[0] - 1 : months[1], k].sum(axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return np.arange(first, last + 1) + cube.first_year, means
+
+
+def station_metrics(
+    cube: Cube,
+    years: Tuple[int, int],
+    months: Tuple[int, int],
+    reference: Tuple[int, int],
+    metrics: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """Computes the station x metric table shown on the map
+
+    For every metric: the trend of the yearly means (slope, p value and conclusion, fitted for all the
+    stations at once with fit_trends) and the anomaly, the mean of the years after the reference period
+    minus the mean of the reference period. The category of results/category_summary.csv is added when the
+    cube has the metrics of CATEGORY_METRICS.
+
+    Args:
+        cube (Cube): the cube
+        years (Tuple[int, int]): first and last year
+        months (Tuple[int, int]): first and last month (1 - 12)
+        reference (Tuple[int, int]): first and last year of the reference period
+        metrics (Optional[Iterable[str]], optional): the metrics. Defaults to None (all the metrics of the cube).
+
+    Returns:
+        pd.DataFrame: one row per station of the cube, the columns <metric>_slope, <metric>_p,
+        <metric>_trend, <metric>_anomaly and category
+    """
+    if metrics is None:
+        metrics = cube.metrics
+    table = pd.DataFrame(index=pd.Index(cube.stations, name="id"))
+    for metric in metrics:
+        year, means = yearly_matrix(cube, metric, years, months)
+        # Step 1: the trends, from the long table of the years with data
+        station, column = np.nonzero(~np.isnan(means))
+        yearly = pd.DataFrame(
+            {
+                "STATIONS_ID": np.asarray(cube.stations)[station],
+                "year": year[column],
+                metric: means[station, column],
+            }
+        )
+        trends = fit_trends(yearly, metric).set_index("station id")
+        table[f"{metric}_slope"] = trends["gradient"]
+        table[f"{metric}_p"] = trends["p_value"]
+        table[f"{metric}_trend"] = trends["conclusion"]
+        # Step 2: the anomaly against the reference period
+        in_reference = (year >= reference[0]) & (year <= reference[1])
+        with warnings.catch_warnings():
+            # the mean of a station without data is NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            table[f"{metric}_anomaly"] = np.nanmean(
+                means[:, year > reference[1]], axis=1
+            ) - np.nanmean(means[:, in_reference], axis=1)
+    # Step 3: the category from the conclusions
+    if all(metric in metrics for metric in CATEGORY_METRICS):
+        signs = [table[f"{metric}_trend"].map(SIGNS) for metric in CATEGORY_METRICS]
+        table["category"] = (signs[0] + signs[1] + signs[2]).map(CATEGORIES)
+    else:
+        table["category"] = np.nan
+    return table
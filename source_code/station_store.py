@@ -0,0 +1,133 @@
+import os
+import shutil
+import pandas as pd
+from typing import List, Optional
+
+STORE_ROOT = "downloads/store"
+SOURCE_FILE = "_source.txt"
+# pinned in requirements.txt, pandas has no parquet support of its own
+PARQUET_ENGINE = "pyarrow"
+
+
+def station_folder(
+    time: str, parameter: str, station: str, root: str = STORE_ROOT
+) -> str:
+    """Returns the folder of a station in the store: <root>/<time>/<parameter>/<station>/"""
+    return os.path.join(root, time, parameter, station)
+
+
+def stored_source(
+    time: str, parameter: str, station: str, root: str = STORE_ROOT
+) -> Optional[str]:
+    """Returns the name of the archive the station was stored from
+
+    Args:
+        time (str): "10_minutes", "hourly" or "daily"
+        parameter (str): "air_temperature","dew_point", "moisture" or "precipitation"
+        station (str): id of the weather station (e.g. "01639")
+        root (str, optional): folder of the store. Defaults to STORE_ROOT.
+
+    Returns:
+        Optional[str]: the archive name, or None if the station is not (completely) stored
+    """
+    path = os.path.join(station_folder(time, parameter, station, root), SOURCE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as myfile:
+        return myfile.read().strip()
+
+
+def write_station(
+    df: pd.DataFrame, time: str, parameter: str, source: str, root: str = STORE_ROOT
+):
+    """Writes the data of one station to the store, one parquet file per year
+
+    The source file is written last, so a station is only seen as stored when all the years are written.
+
+    Args:
+        df (pd.DataFrame): the data of one station, with the "STATIONS_ID" and "year" columns
+        time (str): "10_minutes", "hourly" or "daily"
+        parameter (str): "air_temperature","dew_point", "moisture" or "precipitation"
+        source (str): name of the archive the data comes from
+        root (str, optional): folder of the store. Defaults to STORE_ROOT.
+    """
+    station = str(df["STATIONS_ID"].iloc[0])
+    folder = station_folder(time, parameter, station, root)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    for year, year_df in df.groupby("year"):
+        year_df.to_parquet(
+            os.path.join(folder, f"{year}.parquet"),
+            engine=PARQUET_ENGINE,
+            index=False,
+        )
+    with open(os.path.join(folder, SOURCE_FILE), "w") as myfile:
+        myfile.write(source)
+
+
+def stored_stations(time: str, parameter: str, root: str = STORE_ROOT) -> List[str]:
+    """Returns the ids of the stations that are completely stored for the parameter"""
+    folder = os.path.join(root, time, parameter)
+    if not os.path.exists(folder):
+        return []
+    return sorted(
+        station
+        for station in os.listdir(folder)
+        if stored_source(time, parameter, station, root) is not None
+    )
+
+
+def load_store(
+    time: str,
+    parameter: str,
+    stations: Optional[List[str]] = None,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    root: str = STORE_ROOT,
+) -> pd.DataFrame:
+    """Loads data from the store, reading only the requested stations, years and columns
+
+    Args:
+        time (str): "10_minutes", "hourly" or "daily"
+        parameter (str): "air_temperature","dew_point", "moisture" or "precipitation"
+        stations (Optional[List[str]], optional): ids of the stations. Defaults to None (all stored stations).
+        start_year (Optional[int], optional): first year to load. Defaults to None.
+        end_year (Optional[int], optional): last year to load. Defaults to None.
+        columns (Optional[List[str]], optional): columns to load. Defaults to None (all columns).
+        root (str, optional): folder of the store. Defaults to STORE_ROOT.
+
+    Returns:
+        pd.DataFrame: the requested data
+    """
+    if stations is None:
+        stations = stored_stations(time, parameter, root)
+    # the same categories for every station, so that concat keeps the categorical dtype
+    station_dtype = pd.CategoricalDtype(sorted(set(stations)))
+    frames = []
+    for station in stations:
+        if stored_source(time, parameter, station, root) is None:
+            continue
+        folder = station_folder(time, parameter, station, root)
+        years = sorted(
+            int(name.split(".")[0])
+            for name in os.listdir(folder)
+            if name.endswith(".parquet")
+        )
+        for year in years:
+            if start_year is not None and year < start_year:
+                continue
+            if end_year is not None and year > end_year:
+                continue
+            frame = pd.read_parquet(
+                os.path.join(folder, f"{year}.parquet"),
+                engine=PARQUET_ENGINE,
+                columns=columns,
+            )
+            if "STATIONS_ID" in frame.columns:
+                frame["STATIONS_ID"] = frame["STATIONS_ID"].astype(station_dtype)
+            frames.append(frame)
+    if len(frames) == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,86 @@
+import os
+
+import pandas as pd
+import pytest
+
+from source_code.aggregate_cube import (
+    build_cube,
+    check_cube,
+    load_cube,
+    station_file,
+    yearly_means,
+)
+
+
+def _write(data_folder, station, parameter, column, values):
+    # hourly rows of January 2000 and July 2001
+    df = pd.DataFrame(
+        {
+            "year": [2000] * len(values) + [2001] * len(values),
+            "month": [1] * len(values) + [7] * len(values),
+            "day": 1,
+            "hour": list(range(len(values))) * 2,
+            column: list(values) * 2,
+        }
+    )
+    path = station_file(station, parameter, data_folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def folders(tmp_path):
+    data_folder = str(tmp_path / "hourly")
+    _write(data_folder, "00001", "air_temperature", "TT_TU", [10.0, 20.0, -999])
+    _write(data_folder, "00001", "moisture", "RF_STD", [80.0, 95.0, 100.0])
+    _write(data_folder, "00002", "air_temperature", "TT_TU", [15.0, 25.0, 5.0])
+    return data_folder, str(tmp_path / "cube")
+
+
+def test_the_cube_answers_the_yearly_means(folders):
+    data_folder, folder = folders
+    build_cube(["00001", "00002"], data_folder, folder, 2000, 2001)
+    cube = load_cube(folder)
+    # -999 is not counted
+    means = yearly_means(cube, "00001", "TT_TU", (2000, 2001), (1, 12))
+    assert means.to_dict() == {2000: 15.0, 2001: 15.0}
+    assert yearly_means(
+        cube, "00001", "leaf_wetness", (2000, 2001), (1, 6)
+    ).to_dict() == {2000: 2 / 3}
+    # the station without a moisture file has no moisture data
+    assert yearly_means(cube, "00002", "RF_STD", (2000, 2001), (1, 12)).empty
+
+
+def test_a_station_without_files_is_logged(folders, caplog):
+    data_folder, folder = folders
+    build_cube(["00001", "00002"], data_folder, folder, 2000, 2001)
+    assert "moisture/00002" in caplog.text
+
+
+def test_no_cube_without_hourly_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        build_cube(["00001"], str(tmp_path / "hourly"), str(tmp_path / "cube"))
+
+
+def test_check_cube_finds_a_missing_or_stale_cube(folders):
+    data_folder, folder = folders
+    stations = ["00001", "00002"]
+    with pytest.raises(FileNotFoundError):
+        check_cube(stations, folder, data_folder)
+    build_cube(stations, data_folder, folder, 2000, 2001)
+    check_cube(stations, folder, data_folder)
+    with pytest.raises(ValueError, match="other stations"):
+        check_cube(["00001"], folder, data_folder)
+    # a changed hourly file
+    _write(data_folder, "00001", "moisture", "RF_STD", [50.0, 60.0, 70.0, 80.0])
+    with pytest.raises(ValueError, match="moisture/00001"):
+        check_cube(stations, folder, data_folder)
+    # a new hourly file
+    build_cube(stations, data_folder, folder, 2000, 2001)
+    _write(data_folder, "00002", "moisture", "RF_STD", [50.0])
+    with pytest.raises(ValueError, match="moisture/00002"):
+        check_cube(stations, folder, data_folder)
+    build_cube(stations, data_folder, folder, 2000, 2001)
+    # without the hourly data (as on the server) only the stations and metrics are checked
+    check_cube(stations, folder, data_folder + "_not_deployed")
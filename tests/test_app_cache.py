@@ -0,0 +1,33 @@
+import json
+
+import numpy as np
+
+from source_code.app_cache import LRUCache, size_of
+
+
+def test_a_figure_is_sized_without_serialising_it():
+    values = np.arange(1000, dtype="float64")
+    figure = {
+        "data": [{"type": "scattergeo", "lon": values, "lat": values.tolist()}],
+        "layout": {"title": {"text": "stations"}, "geo": {"projection_scale": 7}},
+    }
+    # the array by its nbytes and the list of numbers at 8 bytes each
+    assert size_of(figure) > 2 * values.nbytes
+    assert size_of(figure) < 2 * values.nbytes + 200
+    payload = {"year": {"dtype": "int16", "data": "AAAA" * 500}, "name": "x"}
+    assert abs(size_of(payload) - len(json.dumps(payload))) < 100
+
+
+def test_the_cache_is_bounded_by_the_size_of_its_entries():
+    cache = LRUCache(max_items=10, max_bytes=1000)
+    for key in range(5):
+        cache.put(key, "x" * 300)
+    assert cache.stats()["items"] == 3
+    assert cache.stats()["bytes"] == 900
+    assert cache.get(0) is None
+    assert cache.get(4) == "x" * 300
+    # larger than the whole cache: not cached
+    cache.put("big", "x" * 2000)
+    assert cache.get("big") is None
+    assert cache.get_or_compute("new", lambda: "y" * 100) == "y" * 100
+    assert cache.stats()["bytes"] == 1000
@@ -0,0 +1,100 @@
+import os
+
+import matplotlib
+import numpy as np
+import pandas as pd
+import pytest
+
+from source_code import batch_render
+from source_code.batch_render import (
+    fingerprint,
+    read_manifest,
+    render_stations,
+    station_output,
+)
+from source_code.station_store import write_station
+
+OPTIONS = {"start_dd_mm": "01.04", "end_dd_mm": "30.06", "treshhold": 70}
+STATIONS = ["00001", "00002"]
+
+
+def _moisture(station, seed):
+    # every third hour of 1975 - 1984
+    rng = np.random.default_rng(seed)
+    time = pd.DatetimeIndex(
+        np.arange("1975-01-01", "1985-01-01", dtype="datetime64[3h]")
+    )
+    return pd.DataFrame(
+        {
+            "STATIONS_ID": station,
+            "year": time.year,
+            "month": time.month,
+            "day": time.day,
+            "hour": time.hour,
+            "RF_STD": rng.uniform(40, 100, len(time)).round(1),
+        }
+    )
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # the store and the figures are read and written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    for seed, station in enumerate(STATIONS):
+        write_station(_moisture(station, seed), "hourly", "moisture", f"{station}_v1")
+    return tmp_path
+
+
+def _render(**kwargs):
+    result = render_stations(
+        "dryness", kwargs.pop("options", OPTIONS), n_workers=1, **kwargs
+    )
+    return {key: sorted(stations) for key, stations in result.items()}
+
+
+def test_the_figures_are_rendered_once(store):
+    assert _render() == {"rendered": STATIONS, "skipped": [], "missing": []}
+    for station in STATIONS:
+        assert os.path.getsize(station_output("dryness", station)) > 0
+    manifest = read_manifest("dryness")
+    assert manifest == {
+        station: fingerprint("dryness", station, OPTIONS) for station in STATIONS
+    }
+    assert _render() == {"rendered": [], "skipped": STATIONS, "missing": []}
+    # the figures of the process are freed afterwards
+    assert batch_render._FIGURES == {}
+
+
+def test_a_changed_input_renders_the_figure_again(store):
+    _render()
+    # a new archive of one station
+    write_station(_moisture("00002", 9), "hourly", "moisture", "00002_v2")
+    assert _render()["rendered"] == ["00002"]
+    # a deleted png
+    os.remove(station_output("dryness", "00001"))
+    assert _render()["rendered"] == ["00001"]
+    # other options
+    assert _render(options={**OPTIONS, "treshhold": 80})["rendered"] == STATIONS
+    # forced
+    assert _render(force=True)["rendered"] == STATIONS
+
+
+def test_the_stations_without_data_are_missing(store):
+    result = _render(stations=["00001", "09999"])
+    assert result == {"rendered": ["00001"], "skipped": [], "missing": ["09999"]}
+    assert fingerprint("dryness", "09999", OPTIONS) is None
+    assert "09999" not in read_manifest("dryness")
+
+
+def test_the_fingerprint_follows_the_render_version(store, monkeypatch):
+    key = fingerprint("dryness", "00001", OPTIONS)
+    assert fingerprint("dryness", "00001", dict(reversed(OPTIONS.items()))) == key
+    assert fingerprint("dryness", "00002", OPTIONS) != key
+    monkeypatch.setattr(batch_render, "RENDER_VERSION", batch_render.RENDER_VERSION + 1)
+    assert fingerprint("dryness", "00001", OPTIONS) != key
+
+
+def test_rendering_leaves_the_pyplot_backend_alone(store):
+    backend = matplotlib.get_backend()
+    _render()
+    assert matplotlib.get_backend() == backend
@@ -0,0 +1,67 @@
+import types
+
+import pandas as pd
+import pytest
+
+from source_code import bbch_functions
+
+
+@pytest.fixture
+def observations(monkeypatch):
+    rows = {
+        "mais": [
+            # harvested (24) in 2006, reported twice: the first day counts
+            ("00001", 2006, 24, 280),
+            ("00001", 2006, 24, 290),
+            ("00001", 2007, 24, 300),
+            ("00002", 2006, 24, 270),
+        ],
+        "wheat": [
+            # BBCH75 (19) of 2007 and 2008, nothing for 00002 in 2007
+            ("00001", 2007, 19, 170),
+            ("00001", 2008, 19, 165),
+            ("00001", 2006, 19, 175),
+            ("00002", 2006, 19, 172),
+        ],
+    }
+    columns = ["Stations_id", "Referenzjahr", "Phase_id", "Jultag"]
+    monkeypatch.setattr(
+        bbch_functions,
+        "phenology_index",
+        lambda crop, common_ids=False: types.SimpleNamespace(
+            observations=pd.DataFrame(rows[crop], columns=columns)
+        ),
+    )
+
+
+def test_phenology_windows_pair_the_harvest_with_bbch75_of_the_next_year(
+    observations,
+):
+    windows = bbch_functions.phenology_windows()
+    assert windows.to_dict("records") == [
+        {
+            "STATIONS_ID": "00001",
+            "year": 2007,
+            "start_year": 2006,
+            "start_day": 280,
+            "end_day": 170,
+        },
+        {
+            "STATIONS_ID": "00001",
+            "year": 2008,
+            "start_year": 2007,
+            "start_day": 300,
+            "end_day": 165,
+        },
+    ]
+
+
+def test_phenology_windows_in_the_same_year(observations):
+    windows = bbch_functions.phenology_windows(
+        start=("wheat", 19), end=("mais", 24), start_year_offset=0
+    )
+    assert windows[["STATIONS_ID", "year", "start_year"]].values.tolist() == [
+        ["00001", 2006, 2006],
+        ["00001", 2007, 2007],
+        ["00002", 2006, 2006],
+    ]
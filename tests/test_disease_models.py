@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from source_code.disease_models import (
+    apply_model,
+    equation_fusarium,
+    equation_fusarium_array,
+    equation_fusarium_rh,
+    equation_fusarium_rh_array,
+)
+
+
+def _scalar(func, values):
+    return np.array([func(x) for x in values.tolist()], dtype="float64")
+
+
+def _edges(*points):
+    # the points and their neighbouring floats
+    return [
+        value
+        for point in points
+        for value in (np.nextafter(point, -np.inf), point, np.nextafter(point, np.inf))
+    ]
+
+
+def test_equation_fusarium_array_is_bit_for_bit_equal():
+    t = np.concatenate(
+        [np.linspace(-10, 45, 200002), _edges(5.0, 30.0), [np.nan, -np.inf, np.inf]]
+    )
+    assert np.array_equal(
+        equation_fusarium_array(t), _scalar(equation_fusarium, t), equal_nan=True
+    )
+
+
+def test_equation_fusarium_rh_array_is_bit_for_bit_equal():
+    rh = np.concatenate(
+        [np.linspace(0, 110, 100002), _edges(100.0), [np.nan, -np.inf, np.inf]]
+    )
+    assert np.array_equal(
+        equation_fusarium_rh_array(rh),
+        _scalar(equation_fusarium_rh, rh),
+        equal_nan=True,
+    )
+
+
+@pytest.mark.parametrize(
+    "func, low, high",
+    [(equation_fusarium, -10, 45), (equation_fusarium_rh, 0, 110)],
+)
+def test_apply_model_on_stored_float32_values(func, low, high):
+    # the store keeps the measurements as float32 with a resolution of 0.1
+    values = np.round(np.arange(low, high, 0.1), 1).astype("float32")
+    values[::7] = np.nan
+    assert np.array_equal(
+        apply_model(func, values), _scalar(func, values), equal_nan=True
+    )
@@ -0,0 +1,87 @@
+import pandas as pd
+
+from source_code.dwd_index import (
+    coverage_matrix,
+    covering_stations,
+    index_frame,
+    station_coverage,
+)
+
+LINK = "https://x/stundenwerte_TU_{}_{}_{}_hist.zip"
+
+
+def _links(*archives):
+    return {"hourly": {"air_temperature": {LINK.format(*a) for a in archives}}}
+
+
+def test_station_coverage_merges_contiguous_and_overlapping_archives():
+    links = _links(
+        # contiguous: 1999-12-31 is followed by 2000-01-01
+        ("00001", "19500101", "19991231"),
+        ("00001", "20000101", "20201231"),
+        # overlapping, the second ends inside the first
+        ("00002", "19600101", "20201231"),
+        ("00002", "19700101", "19801231"),
+        # a gap from 1980 to 1990
+        ("00003", "19500101", "19791231"),
+        ("00003", "19900101", "20201231"),
+    )
+    coverage = station_coverage(links, "hourly", ["air_temperature"])
+    expected = pd.DataFrame(
+        {
+            "station_id": ["00001", "00002", "00003", "00003"],
+            "parameter": "air_temperature",
+            "start": [1950, 1960, 1950, 1990],
+            "end": [2020, 2020, 1979, 2020],
+        }
+    )
+    pd.testing.assert_frame_equal(
+        coverage.reset_index(drop=True), expected, check_dtype=False
+    )
+
+
+def test_a_gap_breaks_the_coverage():
+    links = _links(
+        ("00001", "19500101", "19991231"),
+        ("00001", "20000101", "20201231"),
+        ("00003", "19500101", "19791231"),
+        ("00003", "19900101", "20201231"),
+    )
+    coverage = station_coverage(links, "hourly", ["air_temperature"])
+    assert covering_stations(coverage, ["air_temperature"], 1950, 2020) == ["00001"]
+    assert covering_stations(coverage, ["air_temperature"], 1990, 2020) == [
+        "00001",
+        "00003",
+    ]
+
+
+def test_coverage_matrix_counts_the_covering_stations():
+    links = {
+        "hourly": {
+            "air_temperature": {
+                LINK.format("00001", "19500101", "20201231"),
+                LINK.format("00002", "19700101", "20201231"),
+            },
+            "moisture": {
+                LINK.format("00001", "19600101", "20201231"),
+                LINK.format("00002", "19500101", "20201231"),
+            },
+        }
+    }
+    parameters = ["air_temperature", "moisture"]
+    coverage = station_coverage(links, "hourly", parameters)
+    counts = coverage_matrix(coverage, parameters, [1950, 1960, 1970], 2020)
+    assert counts.to_dict("list") == {
+        "air_temperature": [1, 1, 2],
+        "moisture": [1, 2, 2],
+        "all": [0, 1, 2],
+    }
+
+
+def test_index_frame_reads_the_years_from_the_links():
+    df = index_frame(
+        _links(("01639", "19500101", "20201231")), "hourly", "air_temperature"
+    )
+    assert df[["station_id", "start_year", "end_year"]].values.tolist() == [
+        ["01639", 1950, 2020]
+    ]
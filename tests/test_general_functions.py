@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from source_code.general_functions import (
+    select_time_range,
+    window_mask,
+    window_seasons,
+)
+
+
+def _daily(stations=("00001", "01639"), start="2005-01-01", end="2008-12-31"):
+    days = pd.date_range(start, end, freq="D")
+    df = pd.DataFrame(
+        {
+            "STATIONS_ID": np.repeat(stations, len(days)),
+            "year": np.tile(days.year, len(stations)),
+            "month": np.tile(days.month, len(stations)),
+            "day": np.tile(days.day, len(stations)),
+        }
+    )
+    df["STATIONS_ID"] = df["STATIONS_ID"].astype("category")
+    return df
+
+
+def _brute_force(df, windows):
+    # the season of every row, from the dates of the windows
+    dates = pd.to_datetime(df[["year", "month", "day"]]).to_numpy()
+    stations = df["STATIONS_ID"].astype(str).to_numpy()
+    seasons = np.full(len(df), -1)
+    for window in windows.itertuples():
+        start_year = getattr(window, "start_year", None)
+        if start_year is None:
+            start_year = window.year - (window.start_day > window.end_day)
+        first = pd.Timestamp(start_year, 1, 1) + pd.Timedelta(days=window.start_day - 1)
+        last = pd.Timestamp(window.year, 1, 1) + pd.Timedelta(days=window.end_day - 1)
+        inside = (
+            (stations == str(window.STATIONS_ID).zfill(5))
+            & (dates >= first)
+            & (dates <= last)
+        )
+        assert (seasons[inside] == -1).all()
+        seasons[inside] = window.year
+    return seasons
+
+
+WINDOWS = pd.DataFrame(
+    {
+        # the ids of the windows may be numbers
+        "STATIONS_ID": ["00001", "00001", "00001", 1639, 1639],
+        "year": [2006, 2007, 2008, 2006, 2008],
+        # maize harvest of the year before to wheat BBCH75, across the new year
+        "start_year": [2005, 2006, 2007, 2005, 2007],
+        # 2008 is a leap year: day 60 is the 29th of February
+        "start_day": [280, 300, 250, 290, 270],
+        "end_day": [170, 160, 60, 175, 180],
+    }
+)
+
+
+def test_window_seasons_across_the_new_year():
+    df = _daily()
+    seasons = window_seasons(df, WINDOWS)
+    assert np.array_equal(seasons, _brute_force(df, WINDOWS))
+    assert np.array_equal(window_mask(df, WINDOWS), seasons >= 0)
+    # the 1st of January 2007 of station 00001 belongs to the season 2007
+    first_january = (df["STATIONS_ID"] == "00001") & (df["year"] == 2007)
+    assert seasons[first_january.to_numpy() & (df["month"] == 1).to_numpy()][0] == 2007
+
+
+def test_window_seasons_without_start_year():
+    df = _daily()
+    # a window starting after it ends starts the year before
+    windows = WINDOWS.drop(columns="start_year")
+    assert np.array_equal(window_seasons(df, windows), window_seasons(df, WINDOWS))
+    # and one starting before it ends stays in its year
+    same_year = windows.assign(start_day=windows["end_day"] - 50)
+    assert np.array_equal(window_seasons(df, same_year), _brute_force(df, same_year))
+
+
+def test_window_seasons_without_windows():
+    df = _daily()
+    assert (window_seasons(df, WINDOWS.iloc[:0]) == -1).all()
+
+
+def test_select_time_range_counts_the_rows_in_their_season():
+    df = _daily()
+    selected = select_time_range(df, "", "", windows=WINDOWS)
+    seasons = _brute_force(df, WINDOWS)
+    assert len(selected) == (seasons >= 0).sum()
+    assert np.array_equal(selected["year"].to_numpy(), seasons[seasons >= 0])
+    assert selected["year"].dtype == df["year"].dtype
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from source_code.disease_models import equation_fusarium, equation_fusarium_rh
+from source_code.lm_fusarium import (
+    fit_trends,
+    linear_model_combined,
+    linear_model_moisture,
+    linear_model_temperature,
+)
+
+
+def _yearly():
+    rng = np.random.default_rng(7)
+    frames = []
+    # stations with a clear trend, noise only, two years, one year and a constant series
+    for station, years, slope, noise in [
+        ("00001", np.arange(1950, 2021), 0.05, 1.0),
+        ("00002", np.arange(1980, 2021), 0.0, 2.0),
+        ("00003", np.arange(1990, 2020, 3), -0.2, 0.5),
+        ("00004", np.array([2000, 2001]), 1.0, 0.0),
+        ("00005", np.array([2010]), 0.0, 1.0),
+        # constant series: r is 0 and p is 1 as with the pinned scipy, recent linregress gives NaN
+        ("00006", np.arange(2000, 2010), 0.0, 0.0),
+    ]:
+        values = 3 + slope * (years - years[0]) + noise * rng.normal(size=len(years))
+        frames.append(
+            pd.DataFrame({"STATIONS_ID": station, "year": years, "v": values})
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize("year_minus", [0, 1950])
+def test_fit_trends_matches_linregress(year_minus):
+    yearly = _yearly()
+    result = fit_trends(yearly, "v", year_minus).set_index("station id")
+    for station, group in yearly.groupby("STATIONS_ID"):
+        fit = result.loc[station]
+        if len(group) < 2:
+            # linregress refuses a single year
+            assert np.isnan(fit["gradient"]) and np.isnan(fit["p_value"])
+            continue
+        if group["v"].nunique() == 1:
+            assert fit[["gradient", "r_value", "p_value"]].tolist() == [0.0, 0.0, 1.0]
+            continue
+        expected = stats.linregress(group["year"] - year_minus, group["v"])
+        np.testing.assert_allclose(
+            fit[["gradient", "intercept", "r_value", "p_value"]].to_numpy(float),
+            [
+                expected.slope,
+                expected.intercept,
+                expected.rvalue,
+                expected.pvalue,
+            ],
+            rtol=1e-9,
+            atol=1e-12,
+        )
+
+
+def test_fit_trends_conclusions():
+    result = fit_trends(_yearly(), "v").set_index("station id")["conclusion"]
+    assert result["00001"] == "significant"
+    assert result["00003"] == "significant but decreasing risk"
+    assert result["00006"] == "non-significant"
+
+
+def _hourly(n_stations=3):
+    # every third hour of every day, with a seasonal temperature and humidity
+    rng = np.random.default_rng(3)
+    days = pd.date_range("2000-01-01", "2005-12-31", freq="D")
+    frames = []
+    for station in range(1, n_stations + 1):
+        time = np.repeat(days.to_numpy(), 8) + np.tile(
+            np.arange(0, 24, 3) * np.timedelta64(1, "h"), len(days)
+        )
+        time = pd.DatetimeIndex(time)
+        season = np.sin((time.dayofyear.to_numpy() - 100) / 365 * 2 * np.pi)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "STATIONS_ID": str(station).zfill(5),
+                    "MESS_DATUM": time.strftime("%Y%m%d%H").astype(int),
+                    "year": time.year,
+                    "month": time.month,
+                    "day": time.day,
+                    "hour": time.hour,
+                    "TT_TU": np.round(
+                        10 + 12 * season + rng.normal(0, 3, len(time)), 1
+                    ),
+                    "RF_STD": np.round(
+                        np.clip(
+                            75 - 15 * season + rng.normal(0, 10, len(time)), 10, 100
+                        ),
+                        1,
+                    ),
+                }
+            )
+        )
+    df = pd.concat(frames, ignore_index=True)
+    df["STATIONS_ID"] = df["STATIONS_ID"].astype("category")
+    return df
+
+
+@pytest.mark.parametrize(
+    "model",
+    ["temperature", "moisture", "combined"],
+)
+def test_the_process_pool_gives_the_serial_results(model):
+    df = _hourly()
+    args = {
+        "temperature": (
+            linear_model_temperature,
+            (df, "01.05", "30.06", equation_fusarium),
+        ),
+        "moisture": (
+            linear_model_moisture,
+            (df, "01.05", "30.06", equation_fusarium_rh),
+        ),
+        "combined": (
+            linear_model_combined,
+            (
+                df.drop(columns="RF_STD"),
+                df.drop(columns="TT_TU"),
+                "01.05",
+                "30.06",
+                equation_fusarium,
+                equation_fusarium_rh,
+            ),
+        ),
+    }
+    func, arguments = args[model]
+    serial = func(*arguments)
+    parallel = func(*arguments, n_workers=2)
+    pd.testing.assert_frame_equal(parallel, serial, check_exact=False, rtol=1e-12)
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from source_code.station_matching import (
+    EARTH_RADIUS,
+    nearest_stations,
+    weather_windows,
+)
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def _points(n, seed, prefix):
+    # points in Germany
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "id": [f"{prefix}{i:04d}" for i in range(n)],
+            "lat": rng.uniform(47.5, 54.5, n),
+            "lon": rng.uniform(6.0, 15.0, n),
+        }
+    )
+
+
+def _brute_force(reporters, stations, k, max_distance, power):
+    rows = []
+    for reporter in reporters.itertuples():
+        distance = _haversine(
+            reporter.lat, reporter.lon, stations["lat"], stations["lon"]
+        )
+        order = np.argsort(distance.to_numpy(), kind="stable")[:k]
+        order = order[distance.to_numpy()[order] <= max_distance]
+        weight = distance.to_numpy()[order] ** (-power)
+        for rank, (i, w) in enumerate(zip(order, weight / weight.sum())):
+            rows.append(
+                (reporter.id, stations["id"].iloc[i], rank, distance.iloc[i], w)
+            )
+    return pd.DataFrame(
+        rows, columns=["reporter_id", "id", "rank", "distance", "weight"]
+    )
+
+
+@pytest.mark.parametrize("k, max_distance, power", [(1, 50.0, 2.0), (3, 40.0, 1.0)])
+def test_nearest_stations_match_the_brute_force(k, max_distance, power):
+    reporters = _points(200, 1, "r")
+    stations = _points(300, 2, "s")
+    matches = nearest_stations(reporters, stations, k, max_distance, power)
+    expected = _brute_force(reporters, stations, k, max_distance, power)
+    pd.testing.assert_frame_equal(
+        matches.reset_index(drop=True),
+        expected,
+        check_dtype=False,
+        rtol=1e-9,
+    )
+    assert matches["distance"].max() <= max_distance
+    # the weights of every reporter sum to 1
+    np.testing.assert_allclose(matches.groupby("reporter_id")["weight"].sum(), 1.0)
+
+
+def test_a_station_at_the_reporter_takes_all_the_weight():
+    reporters = pd.DataFrame({"id": ["r"], "lat": [51.0], "lon": [10.0]})
+    stations = pd.DataFrame(
+        {"id": ["near", "here", "far"], "lat": [51.05, 51.0, 51.2], "lon": [10.0] * 3}
+    )
+    matches = nearest_stations(reporters, stations, k=3)
+    assert matches["id"].tolist() == ["here", "near", "far"]
+    assert matches["weight"].tolist() == [1.0, 0.0, 0.0]
+
+
+def test_the_same_weight_without_power():
+    reporters = pd.DataFrame({"id": ["r"], "lat": [51.0], "lon": [10.0]})
+    stations = pd.DataFrame(
+        {"id": ["a", "b"], "lat": [51.05, 51.1], "lon": [10.0, 10.0]}
+    )
+    matches = nearest_stations(reporters, stations, k=2, power=None)
+    assert matches["weight"].tolist() == [0.5, 0.5]
+
+
+def test_weather_windows_average_the_reporters_by_weight():
+    windows = pd.DataFrame(
+        {
+            "STATIONS_ID": ["r1", "r2", "r1", "r3"],
+            "year": [2007, 2007, 2008, 2007],
+            "start_year": [2006, 2006, 2007, 2006],
+            "start_day": [280, 300, 250, 200],
+            "end_day": [170, 160, 150, 100],
+        }
+    )
+    matches = pd.DataFrame(
+        {
+            "reporter_id": ["r1", "r2", "r3"],
+            "id": ["00001", "00001", "00001"],
+            "rank": [0, 0, 1],
+            "distance": [1.0, 3.0, 9.0],
+            # r3 is matched without weight, so it is left out
+            "weight": [0.75, 0.25, 0.0],
+        }
+    )
+    result = weather_windows(windows, matches)
+    assert result.to_dict("records") == [
+        {
+            "STATIONS_ID": "00001",
+            "year": 2007,
+            "start_year": 2006,
+            # 0.75 * 280 + 0.25 * 300 and 0.75 * 170 + 0.25 * 160
+            "start_day": 285,
+            "end_day": 168,
+        },
+        {
+            "STATIONS_ID": "00001",
+            "year": 2008,
+            "start_year": 2007,
+            # the only reporter of 2008 has the weight 0.75
+            "start_day": 250,
+            "end_day": 150,
+        },
+    ]